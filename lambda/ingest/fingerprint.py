@@ -0,0 +1,53 @@
+"""
+Message templating and fingerprinting for coalescing repeated logs
+
+Variable parts of a message (UUIDs, IP addresses, hex values, numbers)
+are masked so that "Timeout after 3012 ms for order 8812" and
+"Timeout after 2999 ms for order 8813" share one template and fingerprint.
+"""
+
+import hashlib
+import re
+import uuid
+
+# One alternation so each message is scanned once; order matters (UUID before hex before number).
+# IPv6 must stand alone (not "cache::add") and look like an address: all 8 groups, or a
+# compressed form with at least two groups and a digit (not "ab::cd").
+_VARIABLE_PATTERN = re.compile(
+    r'(?P<uuid>\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b)'
+    r'|(?P<ip>\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b'
+    r'|(?<![\w:])(?:(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}'
+    r'|(?=[0-9a-fA-F:]*\d)(?=[0-9a-fA-F]{1,4}:)(?:[0-9a-fA-F]{1,4}:)*[0-9a-fA-F]{0,4}::(?:[0-9a-fA-F]{1,4}:)*[0-9a-fA-F]{1,4})(?![\w:]))'
+    r'|(?P<hex>\b0[xX][0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*[a-fA-F])(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b)'
+    r'|(?P<num>\d+(?:\.\d+)?)'
+)
+
+_PLACEHOLDERS = {
+    'uuid': '<UUID>',
+    'ip': '<IP>',
+    'hex': '<HEX>',
+    'num': '<NUM>',
+}
+
+# Namespace for deterministic coalesced log IDs
+COALESCE_NAMESPACE = uuid.UUID('0b7c5a4e-9f1d-4c8e-a6b2-3d5e7f901234')
+
+def _placeholder(match):
+    return _PLACEHOLDERS[match.lastgroup]
+
+def message_template(message):
+    """Replace variable tokens in a message with placeholders"""
+    return _VARIABLE_PATTERN.sub(_placeholder, message)
+
+def fingerprint(template):
+    """Short stable hash of a message template"""
+    return hashlib.blake2b(template.encode('utf-8'), digest_size=8).hexdigest()
+
+def coalesce_log_id(service_name, level, message_fingerprint, window_start):
+    """
+    Deterministic log_id for a (service, level, fingerprint) within one window
+
+    Every container computes the same ID, so repeats across concurrent
+    Lambda instances update the same item.
+    """
+    return str(uuid.uuid5(COALESCE_NAMESPACE, f"{service_name}|{level}|{message_fingerprint}|{window_start}"))
@@ -1,19 +1,97 @@
 import json
 import os
+import time
 import uuid
 from datetime import datetime
-import boto3
 from botocore.exceptions import ClientError
+from log_store import get_backend_name, get_indexed_attributes, get_log_store
+from sampling import load_sampler, weight_attribute
+from sketching import load_sketch_buffer
+from validation import ValidationError, load_validator, parse_body
+from fingerprint import coalesce_log_id, fingerprint, message_template
 
 # Get table name - check both possible environment variable names
 TABLE_NAME = os.environ.get('TABLE_NAME') or os.environ.get('DYNAMODB_TABLE_NAME')
 
+# Per-service payload limits (VALIDATION_LIMITS); payloads are normalized before any write
+VALIDATOR = load_validator()
+
+# Sampler state lives for the lifetime of the warm container (None = sampling disabled)
+SAMPLER = load_sampler()
+
+# Per-(service, hour) analytics sketches buffered in the warm container (None = disabled)
+SKETCHES = load_sketch_buffer()
+
+# Metadata keys copied to top-level attributes so their sparse GSIs can find them
+INDEXED_METADATA_KEYS = get_indexed_attributes()
+MAX_INDEXED_VALUE_BYTES = 1024  # DynamoDB GSI partition keys are limited to 2048 bytes
+
+# Repeats of the same (service, level, message template) within this many seconds share one item (0 = off).
+# Entries carrying an indexed metadata key are never coalesced, so lookups by those keys find every entry.
+COALESCE_WINDOW_SECONDS = int(os.environ.get('COALESCE_WINDOW_SECONDS', 0))
+
 def get_dynamodb_table():
-    """Get DynamoDB table resource"""
-    if not TABLE_NAME:
+    """Get the LogStore for the configured backend (the DynamoDB table by default)"""
+    if not TABLE_NAME and get_backend_name() == 'dynamodb':
         raise ValueError("TABLE_NAME environment variable is not set")
-    dynamodb = boto3.resource('dynamodb')
-    return dynamodb.Table(TABLE_NAME)
+    return get_log_store(TABLE_NAME)
+
+def flush_sampling_summaries(store):
+    """
+    Write dropped-count summaries when the flush interval has passed
+
+    Failures are logged and the counts kept for the next flush, so a
+    summary write never fails log ingestion (a retried request would
+    otherwise be counted as dropped twice).
+    """
+    summaries = SAMPLER.drain_summaries()
+    if not summaries:
+        return
+    try:
+        store.put_batch(summaries)
+    except Exception as e:
+        print(f"ERROR: Failed to flush sampling summaries: {str(e)}")
+        SAMPLER.restore(summaries)
+        return
+    print(f"Flushed {len(summaries)} sampling summaries")
+
+def flush_sketches(store):
+    """
+    Merge buffered sketches into the store when the flush interval has passed
+
+    Failures are logged and the sketches kept for the next flush, so an
+    analytics write never fails log ingestion.
+    """
+    pending = SKETCHES.drain()
+    for i, bucket in enumerate(pending):
+        try:
+            store.merge_sketches(
+                bucket['service_name'],
+                bucket['bucket'],
+                {name: sketch.to_bytes() for name, sketch in bucket['sketches'].items()},
+                bucket['log_count']
+            )
+        except Exception as e:
+            print(f"ERROR: Failed to flush sketches: {str(e)}")
+            SKETCHES.restore(pending[i:])
+            return
+    if pending:
+        print(f"Flushed sketches for {len(pending)} service hour buckets")
+
+def promote_indexed_metadata(log_entry):
+    """Copy configured metadata keys (e.g. trace_id) to top-level string attributes"""
+    metadata = log_entry.get('metadata')
+    if not isinstance(metadata, dict):
+        return
+    for key in INDEXED_METADATA_KEYS:
+        value = metadata.get(key)
+        if value is None or isinstance(value, (dict, list, bool)):
+            continue
+        value = str(value)
+        if not value or len(value.encode('utf-8')) > MAX_INDEXED_VALUE_BYTES:
+            print(f"Not indexing metadata.{key}: value is empty or too long")
+            continue
+        log_entry[key] = value
 
 def lambda_handler(event, context):
     """
@@ -24,57 +102,97 @@ def lambda_handler(event, context):
     print(f"Event keys: {event.keys() if isinstance(event, dict) else 'Not a dict'}")
     
     try:
-        # Parse request body - handle both API Gateway and direct invocation
-        if isinstance(event, dict) and 'body' in event:
-            # API Gateway event - body is a JSON string
-            if isinstance(event['body'], str):
-                print("Parsing API Gateway event - body is string")
-                body = json.loads(event['body'])
-            else:
-                print("API Gateway event - body is already dict")
-                body = event['body']
-        else:
-            # Direct Lambda invocation
-            print("Direct Lambda invocation")
-            body = event
-        
-        print(f"Parsed body keys: {body.keys() if isinstance(body, dict) else 'Not a dict'}")
-        
-        # Validate required fields
-        required_fields = ['service_name', 'log_type', 'level', 'message']
-        missing_fields = [field for field in required_fields if field not in body]
-        
-        if missing_fields:
-            error_msg = f'Missing required fields: {", ".join(missing_fields)}'
+        # Parse (API Gateway, base64 or direct invocation) and normalize before any DynamoDB call
+        try:
+            body = parse_body(event)
+            print(f"Parsed body keys: {body.keys()}")
+            entry = VALIDATOR.normalize(body)
+        except ValidationError as e:
+            error_msg = str(e)
             print(f"Validation failed: {error_msg}")
-            print(f"Body content: {json.dumps(body)}")
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
                 'body': json.dumps({'error': error_msg})
             }
         
-        # Generate log entry
-        log_entry = {
-            'log_id': str(uuid.uuid4()),
-            'timestamp': body.get('timestamp', datetime.utcnow().isoformat() + 'Z'),
-            'service_name': body['service_name'],
-            'log_type': body['log_type'],
-            'level': body['level'].upper(),
-            'message': body['message']
-        }
+        service_name = entry['service_name']
+        level = entry['level']
+        
+        # Update analytics sketches before sampling so they cover all traffic
+        if SKETCHES is not None:
+            SKETCHES.record(service_name, entry['timestamp'], entry.get('metadata'))
+            flush_sketches(get_dynamodb_table())
+        
+        # Generate log entry from the normalized fields
+        log_entry = {'log_id': str(uuid.uuid4()), **entry}
+        
+        if 'metadata' in log_entry:
+            promote_indexed_metadata(log_entry)
+        # Lookups by an indexed key promise every entry, so these are never sampled or coalesced
+        indexed = any(key in log_entry for key in INDEXED_METADATA_KEYS)
+        
+        # Sample low-severity logs for chatty services
+        sample_weight = None
+        if SAMPLER is not None:
+            keep, sample_weight = SAMPLER.decide(service_name, level, force=indexed)
+            flush_sampling_summaries(get_dynamodb_table())
+            if not keep:
+                return {
+                    'statusCode': 202,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({
+                        'message': 'Log entry sampled out',
+                        'sampled': True
+                    })
+                }
         
-        if 'metadata' in body and body['metadata']:
-            log_entry['metadata'] = body['metadata']
+        store = get_dynamodb_table()
         
-        print(f"Writing to DynamoDB table: {TABLE_NAME}")
-        print(f"Log entry: {json.dumps(log_entry)}")
+        if COALESCE_WINDOW_SECONDS > 0 and not indexed:
+            # Coalesce repeats into one item per window instead of one item each
+            template = message_template(log_entry['message'])
+            message_fingerprint = fingerprint(template)
+            window_start = int(time.time()) // COALESCE_WINDOW_SECONDS * COALESCE_WINDOW_SECONDS
+            log_entry['log_id'] = coalesce_log_id(service_name, level, message_fingerprint, window_start)
+            log_entry['fingerprint'] = message_fingerprint
+            log_entry['message_template'] = template
+            log_entry['first_seen'] = log_entry['timestamp']
+            # Entry timestamps come from clients, so readers use this to know when the item stops changing
+            log_entry['window_end'] = datetime.utcfromtimestamp(window_start + COALESCE_WINDOW_SECONDS).isoformat() + 'Z'
+            
+            print(f"Coalescing into {get_backend_name()} log store: {TABLE_NAME}")
+            print(f"Log entry: {json.dumps(log_entry, default=str)}")
+            
+            occurrence_count = store.upsert_coalesced(
+                log_entry,
+                log_entry['timestamp'],
+                weight=weight_attribute(sample_weight) if sample_weight is not None else None
+            )
+            
+            print(f"SUCCESS: Log coalesced - service={service_name}, level={level}, count={occurrence_count}")
+            
+            return {
+                'statusCode': 201,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({
+                    'message': 'Log entry created successfully',
+                    'log_id': log_entry['log_id'],
+                    'coalesced': True,
+                    'occurrence_count': occurrence_count
+                })
+            }
+        
+        if sample_weight is not None:
+            log_entry['sample_weight'] = weight_attribute(sample_weight)
         
-        # Store in DynamoDB
-        table = get_dynamodb_table()
-        table.put_item(Item=log_entry)
+        print(f"Writing to {get_backend_name()} log store: {TABLE_NAME}")
+        print(f"Log entry: {json.dumps(log_entry, default=str)}")
         
-        print(f"SUCCESS: Log ingested - service={body['service_name']}, level={body['level']}")
+        # Store in DynamoDB (or the configured LogStore backend)
+        store.put(log_entry)
+        
+        print(f"SUCCESS: Log ingested - service={service_name}, level={level}")
         
         return {
             'statusCode': 201,
@@ -85,14 +203,6 @@ def lambda_handler(event, context):
             })
         }
         
-    except json.JSONDecodeError as e:
-        error_msg = f"Invalid JSON: {str(e)}"
-        print(f"ERROR: {error_msg}")
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': error_msg})
-        }
     except ClientError as e:
         print(f"ERROR: DynamoDB ClientError: {str(e)}")
         return {
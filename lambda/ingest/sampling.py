@@ -0,0 +1,207 @@
+"""
+Adaptive per-service sampling of low-severity logs
+
+Configured with the SAMPLING_RULES environment variable (JSON). Keys are
+service names, with "*" as the fallback for services without a rule. Each
+rule maps a level to a base keep rate and may set target_wps, the
+writes-per-second budget for that service:
+
+    {
+        "*":        {"DEBUG": 0.1, "INFO": 0.5, "target_wps": 50},
+        "checkout": {"DEBUG": 0.01, "target_wps": 20}
+    }
+
+A service rule is merged over the "*" rule. Level keys go through the same
+normalization as ingested levels (so "warning" configures WARN). Levels
+without a rate are always kept, and ERROR and above are never sampled.
+Rules are validated at cold start: rates must be numbers from 0 to 1 and
+target_wps a positive number.
+
+When target_wps is set, the base rates are scaled every second so the
+expected writes for the next window stay inside the budget after
+unsampled (ERROR and above) writes are accounted for. target_wps is the
+service's total budget: each warm container only sees its own traffic, so
+it holds target_wps / SAMPLING_CONTAINERS (the expected number of
+concurrent ingest containers, default 1). With more containers than
+that, a service can write up to that many times its share.
+
+Kept items carry sample_weight (1 / keep rate). Dropped counts are kept
+per (service, level) in the warm container and written as sampling
+summary items every SAMPLING_FLUSH_SECONDS. Totals can be reconstructed
+either exactly (kept items + summary dropped_count) or as an estimate
+(sum of sample_weight). Counts not yet flushed are lost if the container
+is recycled.
+"""
+
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+from validation import LEVELS, ValidationError, normalize_level
+
+# Levels below ERROR can be sampled (LEVELS is ordered by severity)
+SAMPLEABLE_LEVELS = frozenset(LEVELS[:LEVELS.index('ERROR')])
+
+SUMMARY_LOG_TYPE = 'sampling_summary'
+ADJUST_INTERVAL_SECONDS = 1.0
+MIN_SCALE = 0.001
+
+def is_sampleable(level):
+    """Unknown levels are never sampled"""
+    return level in SAMPLEABLE_LEVELS
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def normalize_rule(service_name, rule):
+    """Validate one SAMPLING_RULES entry and key its rates by normalized level"""
+    if not isinstance(rule, dict):
+        raise ValueError(f"SAMPLING_RULES for {service_name} must be an object")
+    normalized = {}
+    for key, value in rule.items():
+        if key == 'target_wps':
+            if not _is_number(value) or value <= 0:
+                raise ValueError(f"SAMPLING_RULES {service_name}.target_wps must be a positive number")
+            normalized[key] = value
+            continue
+        try:
+            level = normalize_level(key)
+        except ValidationError:
+            raise ValueError(f"SAMPLING_RULES {service_name}: unknown level {key!r}")
+        if not _is_number(value) or not 0 <= value <= 1:
+            raise ValueError(f"SAMPLING_RULES {service_name}.{key} must be a number from 0 to 1")
+        normalized[level] = value
+    return normalized
+
+class _ServiceState:
+    """Per-service counters for the current adjustment window"""
+
+    def __init__(self):
+        self.scale = 1.0
+        self.window_start = None
+        self.seen = {}  # level -> sampleable items seen this window
+        self.forced = 0  # items that bypass sampling this window
+
+class Sampler:
+    """Decides whether to keep a log item and tracks what was dropped"""
+
+    def __init__(self, rules, flush_interval=60.0, containers=1, clock=time.monotonic, rng=random.random):
+        if containers < 1:
+            raise ValueError("containers must be at least 1")
+        self.rules = {service: normalize_rule(service, rule) for service, rule in rules.items()}
+        self.flush_interval = flush_interval
+        self.containers = containers
+        self._clock = clock
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._services = {}
+        self._dropped = {}  # (service, level) -> count
+        self._dropped_since = datetime.utcnow()
+        self._last_flush = clock()
+
+    def rule_for(self, service_name):
+        rule = dict(self.rules.get('*', {}))
+        rule.update(self.rules.get(service_name, {}))
+        return rule
+
+    def _adjust(self, state, rule, now):
+        """Rescale base rates from the demand seen in the window that just ended"""
+        target = rule.get('target_wps')
+        elapsed = now - state.window_start
+        if target is not None and elapsed > 0:
+            # This container's share of the service budget
+            budget = max(float(target) / self.containers * elapsed - state.forced, 0.0)
+            expected = sum(count * float(rule.get(level, 1.0)) for level, count in state.seen.items())
+            if expected > 0:
+                desired = min(1.0, max(MIN_SCALE, budget / expected))
+                # Smooth so a single burst does not swing the rate to the floor
+                state.scale = 0.5 * state.scale + 0.5 * desired
+        state.window_start = now
+        state.seen = {}
+        state.forced = 0
+
+    def decide(self, service_name, level, force=False):
+        """
+        Return (keep, weight) for an item
+
+        force keeps the item (e.g. one carrying a trace ID) while still
+        counting it against the budget. weight is None when the item was
+        not subject to sampling.
+        """
+        rule = self.rule_for(service_name)
+        now = self._clock()
+        with self._lock:
+            state = self._services.get(service_name)
+            if state is None:
+                state = self._services[service_name] = _ServiceState()
+                state.window_start = now
+            elif now - state.window_start >= ADJUST_INTERVAL_SECONDS:
+                self._adjust(state, rule, now)
+
+            if force or not is_sampleable(level) or level not in rule:
+                state.forced += 1
+                return True, None
+
+            state.seen[level] = state.seen.get(level, 0) + 1
+            rate = min(1.0, float(rule[level]) * state.scale)
+            if rate > 0 and self._rng() < rate:
+                return True, 1.0 / rate
+
+            key = (service_name, level)
+            self._dropped[key] = self._dropped.get(key, 0) + 1
+            return False, None
+
+    def drain_summaries(self, force=False):
+        """Return summary items for dropped counts if the flush interval has passed"""
+        now = self._clock()
+        with self._lock:
+            if not self._dropped or (not force and now - self._last_flush < self.flush_interval):
+                return []
+            dropped, self._dropped = self._dropped, {}
+            window_start, self._dropped_since = self._dropped_since, datetime.utcnow()
+            self._last_flush = now
+
+        window_end = datetime.utcnow().isoformat() + 'Z'
+        return [
+            {
+                'log_id': str(uuid.uuid4()),
+                'timestamp': window_end,
+                'service_name': service_name,
+                'log_type': SUMMARY_LOG_TYPE,
+                'level': level,
+                'message': f"Sampled out {count} {level} log entries",
+                'dropped_count': count,
+                'window_start': window_start.isoformat() + 'Z',
+                'window_end': window_end
+            }
+            for (service_name, level), count in sorted(dropped.items())
+        ]
+
+    def restore(self, summaries):
+        """Put drained counts back after a failed write so they are retried"""
+        with self._lock:
+            for summary in summaries:
+                key = (summary['service_name'], summary['level'])
+                self._dropped[key] = self._dropped.get(key, 0) + summary['dropped_count']
+
+def weight_attribute(weight):
+    """DynamoDB rejects floats, so weights are stored as Decimal"""
+    return Decimal(str(round(weight, 4)))
+
+def load_sampler():
+    """Build a Sampler from the environment, or None when sampling is disabled"""
+    raw = os.environ.get('SAMPLING_RULES', '').strip()
+    if not raw:
+        return None
+    rules = json.loads(raw)
+    if not isinstance(rules, dict):
+        raise ValueError("SAMPLING_RULES must be a JSON object")
+    flush_interval = float(os.environ.get('SAMPLING_FLUSH_SECONDS', 60))
+    containers = int(os.environ.get('SAMPLING_CONTAINERS', 1))
+    return Sampler(rules, flush_interval=flush_interval, containers=containers)
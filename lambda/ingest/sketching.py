@@ -0,0 +1,139 @@
+"""
+Per-(service, hour) analytics sketches built at ingest
+
+Configured with comma separated metadata keys:
+- SKETCH_DISTINCT_KEYS (e.g. "request_id,user_id"): one HyperLogLog per key
+  for distinct counts
+- SKETCH_PERCENTILE_KEYS (e.g. "duration_ms"): one t-digest per numeric key
+  for percentiles
+Both empty (the default) disables sketching.
+
+Entries are bucketed by the hour of their timestamp. Sketches are built in
+the warm container and merged into the store every SKETCH_FLUSH_SECONDS
+(default 60), so one conditional write covers many log entries. Entries
+are recorded before sampling, so sketches describe all traffic rather
+than only the kept entries. Updates not yet flushed are lost if the
+container is recycled.
+"""
+
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from log_store.sketches import (DISTINCT_PREFIX, PERCENTILE_PREFIX, HyperLogLog, TDigest,
+                                bucket_for, parse_timestamp)
+
+def numeric_value(value):
+    """Finite float for numbers (including Decimal) and numeric strings; None otherwise"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, Decimal, str)):
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+def entry_bucket(timestamp):
+    """Hour bucket for an entry's timestamp, or the current hour if it is missing or invalid"""
+    if isinstance(timestamp, str):
+        try:
+            return bucket_for(parse_timestamp(timestamp))
+        except ValueError:
+            pass
+    return bucket_for(datetime.utcnow())
+
+class _Bucket:
+    """Sketches and entry count for one (service, bucket) since the last flush"""
+
+    def __init__(self):
+        self.log_count = 0
+        self.sketches = {}  # attribute name -> HyperLogLog or TDigest
+
+    def sketch(self, name, factory):
+        sketch = self.sketches.get(name)
+        if sketch is None:
+            sketch = self.sketches[name] = factory()
+        return sketch
+
+class SketchBuffer:
+    """Accumulates sketches per (service, bucket) until they are flushed"""
+
+    def __init__(self, distinct_keys, percentile_keys, flush_interval=60.0, clock=time.monotonic):
+        self.distinct_keys = tuple(distinct_keys)
+        self.percentile_keys = tuple(percentile_keys)
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}  # (service, bucket) -> _Bucket
+        self._last_flush = clock()
+
+    def record(self, service_name, timestamp, metadata):
+        """Add one log entry's metadata values to its bucket's sketches"""
+        key = (service_name, entry_bucket(timestamp))
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket()
+            bucket.log_count += 1
+            if not isinstance(metadata, dict):
+                return
+            for name in self.distinct_keys:
+                value = metadata.get(name)
+                if value is not None and not isinstance(value, (dict, list)):
+                    bucket.sketch(DISTINCT_PREFIX + name, HyperLogLog).add(value)
+            for name in self.percentile_keys:
+                value = numeric_value(metadata.get(name))
+                if value is not None:
+                    bucket.sketch(PERCENTILE_PREFIX + name, TDigest).add(value)
+
+    def drain(self, force=False):
+        """
+        Return buffered buckets if the flush interval has passed
+
+        Each is a dict with service_name, bucket, log_count and sketches
+        ({attribute name: sketch}).
+        """
+        now = self._clock()
+        with self._lock:
+            if not self._buckets or (not force and now - self._last_flush < self.flush_interval):
+                return []
+            buckets, self._buckets = self._buckets, {}
+            self._last_flush = now
+        return [
+            {
+                'service_name': service_name,
+                'bucket': bucket,
+                'log_count': state.log_count,
+                'sketches': state.sketches
+            }
+            for (service_name, bucket), state in sorted(buckets.items())
+        ]
+
+    def restore(self, drained):
+        """Merge drained buckets back after a failed write so they are retried"""
+        with self._lock:
+            for pending in drained:
+                key = (pending['service_name'], pending['bucket'])
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = _Bucket()
+                bucket.log_count += pending['log_count']
+                for name, sketch in pending['sketches'].items():
+                    if name in bucket.sketches:
+                        sketch.merge(bucket.sketches[name])
+                    bucket.sketches[name] = sketch
+
+def _keys(variable):
+    return tuple(key.strip() for key in os.environ.get(variable, '').split(',') if key.strip())
+
+def load_sketch_buffer():
+    """Build a SketchBuffer from the environment, or None when sketching is disabled"""
+    distinct_keys = _keys('SKETCH_DISTINCT_KEYS')
+    percentile_keys = _keys('SKETCH_PERCENTILE_KEYS')
+    if not distinct_keys and not percentile_keys:
+        return None
+    flush_interval = float(os.environ.get('SKETCH_FLUSH_SECONDS', 60))
+    return SketchBuffer(distinct_keys, percentile_keys, flush_interval=flush_interval)
@@ -0,0 +1,45 @@
+
+import os
+import sys
+
+# Add the parent directory to the path to allow imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fingerprint import coalesce_log_id, fingerprint, message_template
+
+def test_message_template_masks_variable_tokens():
+    """Test numbers, UUIDs, hex values and IPs are masked"""
+    message = ('Request 550e8400-e29b-41d4-a716-446655440000 from 192.168.1.20:8080 '
+               'failed at 0x7ffde3a0 after 1532 ms (sha deadbeef1234)')
+    assert message_template(message) == (
+        'Request <UUID> from <IP> failed at <HEX> after <NUM> ms (sha <HEX>)'
+    )
+    assert message_template('peer fe80::1ff:fe23:4567:890a dropped') == 'peer <IP> dropped'
+
+def test_message_template_keeps_words():
+    """Test plain words that happen to be hex letters are not masked"""
+    assert message_template('cafe deadline added') == 'cafe deadline added'
+
+def test_message_template_keeps_scope_qualified_names():
+    """Test "::"-qualified names are not mistaken for IPv6 addresses"""
+    for message in ('cache::add failed', 'db::fetch error', 'std::vector resize', 'ab::cd'):
+        assert message_template(message) == message
+    assert message_template('ab::cd') != message_template('ef::01')
+    assert message_template('route 2001:db8::1 up') == 'route <IP> up'
+    assert message_template('2001:0db8:85a3:0000:0000:8a2e:0370:7334') == '<IP>'
+
+def test_fingerprint_groups_repeats():
+    """Test messages differing only in IDs share a fingerprint"""
+    first = fingerprint(message_template('Timeout for order 8812 after 3012 ms'))
+    second = fingerprint(message_template('Timeout for order 8813 after 2999 ms'))
+    other = fingerprint(message_template('Order 8812 shipped'))
+    assert first == second
+    assert first != other
+    assert len(first) == 16
+
+def test_coalesce_log_id_is_deterministic_per_window():
+    """Test IDs are stable within a window and differ across windows and levels"""
+    fp = fingerprint('Timeout for order <NUM>')
+    assert coalesce_log_id('svc', 'ERROR', fp, 600) == coalesce_log_id('svc', 'ERROR', fp, 600)
+    assert coalesce_log_id('svc', 'ERROR', fp, 600) != coalesce_log_id('svc', 'ERROR', fp, 660)
+    assert coalesce_log_id('svc', 'ERROR', fp, 600) != coalesce_log_id('svc', 'WARNING', fp, 600)
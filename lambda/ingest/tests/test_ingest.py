@@ -1,16 +1,21 @@
 
+import base64
 import json
 import os
 import sys
 import pytest
 from moto import mock_aws
 import boto3
+from datetime import datetime, timedelta
 
 # Add the parent directory to the path to allow imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Shared layer code (log_store) is on the Lambda path via the layer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'shared', 'python'))
 
 # Set environment variable before importing the handler
 os.environ['DYNAMODB_TABLE_NAME'] = 'test-logs-table'
+os.environ['SKETCH_TABLE_NAME'] = 'test-sketches-table'
 
 # Import the handler using importlib to avoid 'lambda' keyword issue
 import importlib.util
@@ -19,6 +24,11 @@ ingest_module = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(ingest_module)
 lambda_handler = ingest_module.lambda_handler
 
+from sampling import Sampler
+from sketching import SketchBuffer
+from validation import Validator, load_validator
+from log_store.sketches import load_sketch
+
 @pytest.fixture
 def aws_credentials():
     """Mocked AWS Credentials for moto"""
@@ -137,3 +147,368 @@ def test_ingest_log_with_metadata(dynamodb_table):
         assert 'metadata' in stored_item['Item']
         assert stored_item['Item']['metadata']['user_id'] == '12345'
 
+
+def test_ingest_log_sampled_out(dynamodb_table, monkeypatch):
+    """Test sampled-out entries are not stored and are summarized on flush"""
+    sampler = Sampler({'*': {'DEBUG': 0.0}}, flush_interval=0)
+    monkeypatch.setattr(ingest_module, 'SAMPLER', sampler)
+    with mock_aws():
+        event = {
+            'body': json.dumps({
+                'service_name': 'chatty-service',
+                'log_type': 'application',
+                'level': 'DEBUG',
+                'message': 'Noisy debug line'
+            })
+        }
+        
+        response = lambda_handler(event, None)
+        
+        assert response['statusCode'] == 202
+        assert json.loads(response['body'])['sampled'] is True
+        
+        # The next invocation flushes the dropped count as a summary item
+        event['body'] = json.dumps({
+            'service_name': 'chatty-service',
+            'log_type': 'application',
+            'level': 'ERROR',
+            'message': 'Errors are never sampled'
+        })
+        response = lambda_handler(event, None)
+        assert response['statusCode'] == 201
+        
+        items = dynamodb_table.scan()['Items']
+        summaries = [i for i in items if i['log_type'] == 'sampling_summary']
+        assert len(summaries) == 1
+        assert summaries[0]['dropped_count'] == 1
+        assert len(items) == 2
+
+def test_ingest_log_keeps_summaries_when_flush_fails(dynamodb_table, monkeypatch):
+    """Test a failed summary write does not fail the request and is retried on the next flush"""
+    sampler = Sampler({'*': {'DEBUG': 0.0}}, flush_interval=0)
+    monkeypatch.setattr(ingest_module, 'SAMPLER', sampler)
+    with mock_aws():
+        event = {
+            'body': json.dumps({
+                'service_name': 'chatty-service',
+                'log_type': 'application',
+                'level': 'DEBUG',
+                'message': 'Noisy debug line'
+            })
+        }
+        store = ingest_module.get_dynamodb_table()
+
+        def failing_put_batch(items):
+            raise RuntimeError("throttled")
+
+        monkeypatch.setattr(store, 'put_batch', failing_put_batch)
+        monkeypatch.setattr(ingest_module, 'get_dynamodb_table', lambda: store)
+
+        assert lambda_handler(event, None)['statusCode'] == 202
+        assert lambda_handler(event, None)['statusCode'] == 202
+
+        monkeypatch.undo()
+        monkeypatch.setattr(ingest_module, 'SAMPLER', sampler)
+        event['body'] = json.dumps({
+            'service_name': 'chatty-service',
+            'log_type': 'application',
+            'level': 'ERROR',
+            'message': 'Errors are never sampled'
+        })
+        assert lambda_handler(event, None)['statusCode'] == 201
+
+        summaries = [i for i in dynamodb_table.scan()['Items'] if i['log_type'] == 'sampling_summary']
+        assert len(summaries) == 1
+        assert summaries[0]['dropped_count'] == 2
+
+def test_ingest_log_never_samples_indexed_entries(dynamodb_table, monkeypatch):
+    """Test entries carrying an indexed metadata key are kept so lookups return the whole trace"""
+    monkeypatch.setattr(ingest_module, 'SAMPLER', Sampler({'*': {'DEBUG': 0.0}}))
+    monkeypatch.setattr(ingest_module, 'INDEXED_METADATA_KEYS', ('trace_id',))
+    with mock_aws():
+        for i in range(3):
+            event = {
+                'body': json.dumps({
+                    'service_name': 'chatty-service',
+                    'log_type': 'application',
+                    'level': 'DEBUG',
+                    'message': f'Span {i}',
+                    'metadata': {'trace_id': 'trace-abc'}
+                })
+            }
+            
+            response = lambda_handler(event, None)
+            
+            assert response['statusCode'] == 201
+        
+        items = dynamodb_table.scan()['Items']
+        assert len(items) == 3
+        assert all(item['trace_id'] == 'trace-abc' and 'sample_weight' not in item for item in items)
+
+def test_ingest_log_records_sample_weight(dynamodb_table, monkeypatch):
+    """Test kept sampled entries store their sample weight"""
+    sampler = Sampler({'*': {'INFO': 0.5}}, rng=lambda: 0.0)
+    monkeypatch.setattr(ingest_module, 'SAMPLER', sampler)
+    with mock_aws():
+        event = {
+            'body': json.dumps({
+                'service_name': 'test-service',
+                'log_type': 'application',
+                'level': 'INFO',
+                'message': 'Sampled info line'
+            })
+        }
+        
+        response = lambda_handler(event, None)
+        
+        assert response['statusCode'] == 201
+        body = json.loads(response['body'])
+        stored_item = dynamodb_table.get_item(Key={'log_id': body['log_id']})
+        assert stored_item['Item']['sample_weight'] == 2
+
+def test_ingest_log_coalesces_repeated_messages(dynamodb_table, monkeypatch):
+    """Test repeats differing only in numbers/IDs update one item"""
+    monkeypatch.setattr(ingest_module, 'COALESCE_WINDOW_SECONDS', 3600)
+    with mock_aws():
+        log_ids = set()
+        for i in range(3):
+            event = {
+                'body': json.dumps({
+                    'service_name': 'crash-loop-service',
+                    'log_type': 'application',
+                    'level': 'ERROR',
+                    'message': f'Worker {i} crashed: connection to 10.0.0.{i}:5432 refused'
+                })
+            }
+            
+            response = lambda_handler(event, None)
+            
+            assert response['statusCode'] == 201
+            body = json.loads(response['body'])
+            assert body['coalesced'] is True
+            assert body['occurrence_count'] == i + 1
+            log_ids.add(body['log_id'])
+        
+        assert len(log_ids) == 1
+        items = dynamodb_table.scan()['Items']
+        assert len(items) == 1
+        assert items[0]['occurrence_count'] == 3
+        assert items[0]['message'] == 'Worker 0 crashed: connection to 10.0.0.0:5432 refused'
+        assert items[0]['message_template'] == 'Worker <NUM> crashed: connection to <IP> refused'
+        assert 'last_seen' in items[0]
+        assert items[0]['window_end'].endswith('Z')
+
+def test_ingest_log_does_not_coalesce_indexed_entries(dynamodb_table, monkeypatch):
+    """Test entries with an indexed metadata key keep their own item so lookups find each one"""
+    monkeypatch.setattr(ingest_module, 'COALESCE_WINDOW_SECONDS', 3600)
+    monkeypatch.setattr(ingest_module, 'INDEXED_METADATA_KEYS', ('trace_id',))
+    with mock_aws():
+        log_ids = set()
+        for order, trace_id in ((1001, 'trace-A'), (2002, 'trace-B')):
+            event = {
+                'body': json.dumps({
+                    'service_name': 'order-service',
+                    'log_type': 'application',
+                    'level': 'INFO',
+                    'message': f'Processing order {order}',
+                    'metadata': {'trace_id': trace_id}
+                })
+            }
+
+            response = lambda_handler(event, None)
+
+            assert response['statusCode'] == 201
+            body = json.loads(response['body'])
+            assert 'coalesced' not in body
+            log_ids.add(body['log_id'])
+
+        assert len(log_ids) == 2
+        items = dynamodb_table.scan()['Items']
+        assert sorted(item['trace_id'] for item in items) == ['trace-A', 'trace-B']
+        assert all('occurrence_count' not in item for item in items)
+
+def test_ingest_log_promotes_indexed_metadata(dynamodb_table, monkeypatch):
+    """Test configured metadata keys are copied to top-level attributes"""
+    monkeypatch.setattr(ingest_module, 'INDEXED_METADATA_KEYS', ('trace_id', 'request_id'))
+    with mock_aws():
+        event = {
+            'body': json.dumps({
+                'service_name': 'test-service',
+                'log_type': 'application',
+                'level': 'INFO',
+                'message': 'Traced request',
+                'metadata': {
+                    'trace_id': 'trace-abc',
+                    'user_id': '12345'
+                }
+            })
+        }
+        
+        response = lambda_handler(event, None)
+        
+        assert response['statusCode'] == 201
+        body = json.loads(response['body'])
+        stored_item = dynamodb_table.get_item(Key={'log_id': body['log_id']})['Item']
+        assert stored_item['trace_id'] == 'trace-abc'
+        assert stored_item['metadata']['trace_id'] == 'trace-abc'
+        # Sparse: attributes are only written when present
+        assert 'request_id' not in stored_item
+        assert 'user_id' not in stored_item
+
+def test_ingest_log_merges_sketches(dynamodb_table, monkeypatch):
+    """Test sketches are merged into the hour bucket with versioned conditional writes"""
+    monkeypatch.setattr(ingest_module, 'SKETCHES', SketchBuffer(('request_id',), ('duration_ms',), flush_interval=0))
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        sketch_table = dynamodb.create_table(
+            TableName='test-sketches-table',
+            KeySchema=[
+                {'AttributeName': 'service_name', 'KeyType': 'HASH'},
+                {'AttributeName': 'bucket', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'service_name', 'AttributeType': 'S'},
+                {'AttributeName': 'bucket', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        for request_id, duration_ms in (('req-1', 120), ('req-2', '80.5'), ('req-1', 'n/a')):
+            event = {
+                'body': json.dumps({
+                    'service_name': 'checkout',
+                    'log_type': 'application',
+                    'level': 'INFO',
+                    'message': 'Request finished',
+                    'timestamp': '2026-02-02T10:30:45.123Z',
+                    'metadata': {'request_id': request_id, 'duration_ms': duration_ms}
+                })
+            }
+            
+            response = lambda_handler(event, None)
+            
+            assert response['statusCode'] == 201
+        
+        item = sketch_table.get_item(Key={'service_name': 'checkout', 'bucket': '2026-02-02T10'})['Item']
+        assert item['log_count'] == 3
+        assert item['version'] == 3
+        assert load_sketch(item['distinct:request_id'].value).estimate() == 2
+        durations = load_sketch(item['percentiles:duration_ms'].value)
+        assert durations.count == 2
+        assert (durations.min, durations.max) == (80.5, 120)
+
+def test_ingest_log_normalizes_payload(dynamodb_table):
+    """Test level aliases, timestamps, floats and base64 bodies are normalized"""
+    with mock_aws():
+        event = {
+            'isBase64Encoded': True,
+            'body': base64.b64encode(json.dumps({
+                'service_name': 'test-service',
+                'log_type': 'application',
+                'level': ' warning ',
+                'message': 'Slow response',
+                'timestamp': '2026-02-02T12:30:45+02:00',
+                'metadata': {'duration_ms': 812.5, 'tags': ['slow', {'region': 'eu'}]}
+            }).encode('utf-8')).decode('ascii')
+        }
+        
+        response = lambda_handler(event, None)
+        
+        assert response['statusCode'] == 201
+        body = json.loads(response['body'])
+        stored_item = dynamodb_table.get_item(Key={'log_id': body['log_id']})['Item']
+        assert stored_item['level'] == 'WARN'
+        assert stored_item['timestamp'] == '2026-02-02T10:30:45.000000Z'
+        assert stored_item['metadata']['duration_ms'] == 812.5
+        assert stored_item['metadata']['tags'][1]['region'] == 'eu'
+
+def test_ingest_log_rejects_invalid_payloads(dynamodb_table):
+    """Test bad payloads are rejected before anything is written"""
+    valid = {
+        'service_name': 'test-service',
+        'log_type': 'application',
+        'level': 'INFO',
+        'message': 'Test log message'
+    }
+    future = (datetime.utcnow() + timedelta(hours=1)).isoformat() + 'Z'
+    nested = {'a': {'b': {'c': {'d': {'e': {'f': 1}}}}}}
+    invalid_bodies = [
+        dict(valid, level='LOUD'),
+        dict(valid, level=3),
+        dict(valid, timestamp=future),
+        dict(valid, timestamp='yesterday'),
+        dict(valid, message={'text': 'not a string'}),
+        dict(valid, service_name=''),
+        dict(valid, metadata=['not', 'an', 'object']),
+        dict(valid, metadata=nested),
+        dict(valid, metadata={'blob': 'x' * 20000}),
+        dict(valid, metadata={f'key{i}': i for i in range(201)}),
+        ['not', 'an', 'object'],
+    ]
+    with mock_aws():
+        events = [{'body': json.dumps(body)} for body in invalid_bodies]
+        events.append({'body': '{"level": NaN', 'isBase64Encoded': False})
+        events.append({'body': 'not base64!', 'isBase64Encoded': True})
+        events.append({'body': json.dumps(dict(valid, message='x' * 500 * 1024))})
+        # Lone surrogate escapes are valid JSON but cannot be encoded as UTF-8
+        for body in (dict(valid, service_name='svc-\ud800'),
+                     dict(valid, log_type='app\udfff'),
+                     dict(valid, message='short \ud800'),
+                     dict(valid, message='x' * 40 * 1024 + '\ud800'),
+                     dict(valid, metadata={'note': 'bad \ud800'}),
+                     dict(valid, metadata={'bad\ud800': 1})):
+            events.append({'body': json.dumps(body)})
+        # Under the limit in characters but over it in UTF-8 bytes
+        events.append({'body': json.dumps(dict(valid, message='\u20ac' * 150 * 1024), ensure_ascii=False)})
+        
+        for event in events:
+            response = lambda_handler(event, None)
+            
+            assert response['statusCode'] == 400
+            assert 'error' in json.loads(response['body'])
+        
+        assert dynamodb_table.scan()['Items'] == []
+
+def test_ingest_log_applies_per_service_limits(dynamodb_table, monkeypatch):
+    """Test per-service limits truncate or reject oversized messages"""
+    validator = Validator({
+        'terse-service': {'max_message_bytes': 10},
+        'strict-service': {'max_message_bytes': 10, 'truncate_message': False}
+    })
+    monkeypatch.setattr(ingest_module, 'VALIDATOR', validator)
+    with mock_aws():
+        def send(service_name):
+            return lambda_handler({
+                'body': json.dumps({
+                    'service_name': service_name,
+                    'log_type': 'application',
+                    'level': 'INFO',
+                    'message': 'é' * 20
+                })
+            }, None)
+        
+        response = send('terse-service')
+        
+        assert response['statusCode'] == 201
+        body = json.loads(response['body'])
+        stored_item = dynamodb_table.get_item(Key={'log_id': body['log_id']})['Item']
+        assert stored_item['message'] == 'é' * 5
+        assert stored_item['message_truncated'] is True
+        assert stored_item['message_bytes'] == 40
+        
+        assert send('strict-service')['statusCode'] == 400
+        assert send('other-service')['statusCode'] == 201
+
+def test_load_validator_checks_limit_values(monkeypatch):
+    """Test VALIDATION_LIMITS values are type checked at cold start"""
+    for rules in ({'*': {'max_message_bytes': '16384'}},
+                  {'svc': {'max_metadata_depth': 0}},
+                  {'svc': {'max_metadata_keys': True}},
+                  {'*': {'truncate_message': 'false'}},
+                  {'*': {'max_message_bytes': 1024, 'unknown_limit': 1}}):
+        monkeypatch.setenv('VALIDATION_LIMITS', json.dumps(rules))
+        with pytest.raises(ValueError):
+            load_validator()
+    
+    monkeypatch.setenv('VALIDATION_LIMITS', json.dumps({'svc': {'max_message_bytes': 1024, 'truncate_message': False}}))
+    assert load_validator().limits_for('svc')['max_message_bytes'] == 1024
@@ -0,0 +1,119 @@
+
+import os
+import sys
+
+# Add the parent directory to the path to allow imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Shared layer code (log_store) is on the Lambda path via the layer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'shared', 'python'))
+
+import pytest
+
+from sampling import Sampler, load_sampler, SUMMARY_LOG_TYPE
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_error_and_above_never_sampled():
+    """Test ERROR/CRITICAL are kept even with a zero rate configured"""
+    sampler = Sampler({'*': {'ERROR': 0, 'CRITICAL': 0, 'DEBUG': 0}}, rng=lambda: 0.99)
+    assert sampler.decide('svc', 'ERROR') == (True, None)
+    assert sampler.decide('svc', 'CRITICAL') == (True, None)
+    assert sampler.decide('svc', 'DEBUG') == (False, None)
+
+def test_service_rule_overrides_default():
+    """Test per-service rules merge over the '*' rule"""
+    sampler = Sampler({'*': {'DEBUG': 0.5, 'INFO': 0.5}, 'chatty': {'debug': 0.1}})
+    assert sampler.rule_for('chatty') == {'DEBUG': 0.1, 'INFO': 0.5}
+    assert sampler.rule_for('other') == {'DEBUG': 0.5, 'INFO': 0.5}
+
+def test_kept_items_carry_weight():
+    """Test weight is the inverse of the keep rate"""
+    sampler = Sampler({'*': {'INFO': 0.25}}, rng=lambda: 0.1)
+    keep, weight = sampler.decide('svc', 'INFO')
+    assert keep
+    assert weight == 4.0
+
+def test_rates_adapt_to_target_budget():
+    """Test the keep rate drops until writes fit inside target_wps"""
+    clock = FakeClock()
+    sampler = Sampler({'*': {'DEBUG': 1.0, 'target_wps': 10}}, clock=clock)
+
+    kept_per_second = []
+    for _ in range(10):
+        kept = 0
+        for _ in range(1000):
+            keep, _ = sampler.decide('svc', 'DEBUG')
+            kept += keep
+        kept_per_second.append(kept)
+        clock.now += 1.0
+
+    assert kept_per_second[0] == 1000
+    # After a few windows the rate converges close to the budget
+    assert all(k < 40 for k in kept_per_second[-3:])
+
+def test_target_budget_split_across_containers():
+    """Test each container holds its share of target_wps"""
+    clock = FakeClock()
+    sampler = Sampler({'*': {'DEBUG': 1.0, 'target_wps': 40}}, containers=4, clock=clock)
+
+    kept_per_second = []
+    for _ in range(10):
+        kept = 0
+        for _ in range(1000):
+            keep, _ = sampler.decide('svc', 'DEBUG')
+            kept += keep
+        kept_per_second.append(kept)
+        clock.now += 1.0
+
+    # Converges near 40 / 4 writes per second, as with a target of 10 in one container
+    assert all(k < 40 for k in kept_per_second[-3:])
+
+def test_dropped_counts_flushed_as_summaries():
+    """Test summaries are emitted after the flush interval and reconstruct totals"""
+    clock = FakeClock()
+    sampler = Sampler({'*': {'INFO': 0.0}}, flush_interval=60, clock=clock)
+    for _ in range(7):
+        assert sampler.decide('svc', 'INFO') == (False, None)
+
+    assert sampler.drain_summaries() == []
+    clock.now += 61
+    summaries = sampler.drain_summaries()
+    assert len(summaries) == 1
+    assert summaries[0]['log_type'] == SUMMARY_LOG_TYPE
+    assert summaries[0]['service_name'] == 'svc'
+    assert summaries[0]['level'] == 'INFO'
+    assert summaries[0]['dropped_count'] == 7
+
+    # A failed write puts the counts back
+    sampler.restore(summaries)
+    assert sampler.drain_summaries(force=True)[0]['dropped_count'] == 7
+
+def test_rule_levels_are_normalized():
+    """Test level aliases in rules configure the normalized level ingest passes in"""
+    sampler = Sampler({'*': {'WARNING': 0, 'notice': 0.5}}, rng=lambda: 0.99)
+    assert sampler.rule_for('svc') == {'WARN': 0, 'INFO': 0.5}
+    assert sampler.decide('svc', 'WARN') == (False, None)
+    assert sampler.decide('svc', 'FATAL') == (True, None)
+
+def test_load_sampler_rejects_invalid_rules(monkeypatch):
+    """Test SAMPLING_RULES are validated at cold start instead of failing requests"""
+    for rules in ('{"*": {"DEBUG": "ten"}}', '{"*": 0.1}', '{"*": {"DEBUG": 1.5}}',
+                  '{"*": {"LOUD": 0.1}}', '{"*": {"DEBUG": true}}', '{"svc": {"target_wps": 0}}',
+                  '[0.1]'):
+        monkeypatch.setenv('SAMPLING_RULES', rules)
+        with pytest.raises(ValueError):
+            load_sampler()
+
+def test_load_sampler_disabled_without_rules(monkeypatch):
+    """Test sampling is off unless SAMPLING_RULES is set"""
+    monkeypatch.delenv('SAMPLING_RULES', raising=False)
+    assert load_sampler() is None
+    monkeypatch.setenv('SAMPLING_RULES', '{"*": {"DEBUG": 0.1}}')
+    assert isinstance(load_sampler(), Sampler)
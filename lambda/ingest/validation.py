@@ -0,0 +1,277 @@
+"""
+Validation and normalization of ingest payloads
+
+Every request is checked in one pass before anything is written:
+- the body is decoded (base64 API Gateway bodies included) and size checked
+- service_name, log_type and message must be non-empty strings
+- level is mapped to a fixed set (TRACE, DEBUG, INFO, WARN, ERROR, FATAL)
+- timestamp (ISO 8601 or epoch seconds/milliseconds) is parsed to canonical
+  UTC ("2026-02-02T10:30:45.123000Z") and may be at most
+  max_clock_skew_seconds in the future; missing timestamps get the current time
+- metadata must be an object and is walked once to check size, nesting depth
+  and key count, converting floats to Decimal for DynamoDB
+
+Limits can be set per service with the VALIDATION_LIMITS environment
+variable (JSON). Keys are service names, with "*" as the fallback; each rule
+overrides DEFAULT_LIMITS:
+
+    {
+        "*":        {"max_message_bytes": 16384},
+        "checkout": {"max_metadata_bytes": 65536, "truncate_message": false}
+    }
+
+Messages over max_message_bytes are truncated (message_truncated and
+message_bytes record the original size) unless truncate_message is false,
+in which case they are rejected like every other violation.
+"""
+
+import base64
+import binascii
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from log_store.sketches import parse_timestamp
+
+LEVELS = ('TRACE', 'DEBUG', 'INFO', 'WARN', 'ERROR', 'FATAL')
+LEVEL_ALIASES = {
+    'VERBOSE': 'DEBUG',
+    'INFORMATION': 'INFO',
+    'NOTICE': 'INFO',
+    'WARNING': 'WARN',
+    'ERR': 'ERROR',
+    'SEVERE': 'ERROR',
+    'CRITICAL': 'FATAL',
+    'ALERT': 'FATAL',
+    'EMERGENCY': 'FATAL',
+    'PANIC': 'FATAL',
+}
+_LEVEL_MAP = {**{level: level for level in LEVELS}, **LEVEL_ALIASES}
+
+DEFAULT_LIMITS = {
+    'max_message_bytes': 32 * 1024,
+    'max_metadata_bytes': 16 * 1024,
+    'max_metadata_depth': 5,
+    'max_metadata_keys': 200,
+    'max_clock_skew_seconds': 300,
+    'truncate_message': True,
+}
+
+# Items must fit DynamoDB's 400 KB limit with room for the other attributes
+MAX_BODY_BYTES = 400 * 1024
+MAX_ITEM_CONTENT_BYTES = 350 * 1024
+MAX_NAME_BYTES = 256
+MAX_NUMBER_DIGITS = 38  # DynamoDB number precision
+
+_EPOCH_MILLIS_THRESHOLD = 1e11  # larger epoch values are milliseconds
+
+class ValidationError(ValueError):
+    """Payload rejected; the message is returned to the client"""
+
+def parse_body(event):
+    """Return the request payload from an API Gateway event or a direct invocation"""
+    if not isinstance(event, dict) or 'body' not in event:
+        body = event
+    else:
+        body = event['body']
+        if isinstance(body, str):
+            if event.get('isBase64Encoded'):
+                try:
+                    body = base64.b64decode(body, validate=True)
+                except (binascii.Error, ValueError):
+                    raise ValidationError("Invalid base64 body")
+            # Characters are at most 4 bytes in UTF-8, so only encode when the body could be over
+            if len(body) * 4 > MAX_BODY_BYTES and _byte_length(body) > MAX_BODY_BYTES:
+                raise ValidationError(f"Body exceeds {MAX_BODY_BYTES} bytes")
+            try:
+                body = json.loads(body)
+            except (ValueError, RecursionError) as e:
+                raise ValidationError(f"Invalid JSON: {str(e)}")
+    if not isinstance(body, dict):
+        raise ValidationError("Body must be a JSON object")
+    return body
+
+def _byte_length(body):
+    return len(body.encode('utf-8', 'surrogatepass')) if isinstance(body, str) else len(body)
+
+def utf8_length(value, name):
+    """Encoded size of a string; JSON lone surrogate escapes (e.g. "\\ud800") cannot be stored"""
+    if value.isascii():
+        return len(value)
+    try:
+        return len(value.encode('utf-8'))
+    except UnicodeEncodeError:
+        raise ValidationError(f"{name} must be valid UTF-8")
+
+def _required_string(body, name, max_bytes=MAX_NAME_BYTES):
+    value = body[name]
+    if not isinstance(value, str) or not value.strip():
+        raise ValidationError(f"{name} must be a non-empty string")
+    if utf8_length(value, name) > max_bytes:
+        raise ValidationError(f"{name} exceeds {max_bytes} bytes")
+    return value
+
+def normalize_level(value):
+    """Map a level name (any case, common aliases) to one of LEVELS"""
+    level = _LEVEL_MAP.get(value.strip().upper()) if isinstance(value, str) else None
+    if level is None:
+        raise ValidationError(f"level must be one of: {', '.join(LEVELS)}")
+    return level
+
+def normalize_timestamp(value, now, max_skew_seconds):
+    """Canonical UTC timestamp string, rejecting unparseable or future values"""
+    if value is None:
+        moment = now
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000 if value > _EPOCH_MILLIS_THRESHOLD else value
+        try:
+            moment = datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            raise ValidationError("timestamp is out of range")
+    elif isinstance(value, str):
+        try:
+            moment = parse_timestamp(value.strip())
+        except ValueError:
+            raise ValidationError("timestamp must be ISO 8601 or epoch seconds")
+    else:
+        raise ValidationError("timestamp must be ISO 8601 or epoch seconds")
+    if moment - now > timedelta(seconds=max_skew_seconds):
+        raise ValidationError(f"timestamp is more than {max_skew_seconds} seconds in the future")
+    return moment.isoformat(timespec='microseconds') + 'Z'
+
+class _MetadataWalk:
+    """
+    Single walk over metadata that enforces limits while converting values
+
+    Sizes approximate the JSON encoding. The body is already capped at
+    MAX_BODY_BYTES, so the byte budget is checked once per object or list.
+    """
+
+    def __init__(self, limits):
+        self.bytes_left = limits['max_metadata_bytes']
+        self.keys_left = limits['max_metadata_keys']
+        self.max_depth = limits['max_metadata_depth']
+
+    def normalize(self, value, depth):
+        # Exact type checks are the hot path; JSON only produces these types
+        cls = type(value)
+        if cls is str:
+            self.bytes_left -= utf8_length(value, 'metadata') + 2
+            return value
+        if cls is dict or cls is list:
+            if depth >= self.max_depth:
+                raise ValidationError(f"metadata is nested more than {self.max_depth} levels")
+            if cls is list:
+                self.bytes_left -= 2 + len(value)
+                normalized = [self.normalize(item, depth + 1) for item in value]
+            else:
+                self.keys_left -= len(value)
+                if self.keys_left < 0:
+                    raise ValidationError("metadata has too many keys")
+                normalized = {}
+                for key, item in value.items():
+                    if type(key) is not str:
+                        raise ValidationError("metadata keys must be strings")
+                    self.bytes_left -= utf8_length(key, 'metadata') + 4
+                    normalized[key] = self.normalize(item, depth + 1)
+            if self.bytes_left < 0:
+                raise ValidationError("metadata is too large")
+            return normalized
+        if cls is bool or value is None:
+            self.bytes_left -= 5
+            return value
+        if cls is int:
+            digits = len(str(abs(value)))
+            if digits > MAX_NUMBER_DIGITS:
+                raise ValidationError("metadata numbers are limited to 38 digits")
+            self.bytes_left -= digits + 1
+            return value
+        if cls is float:
+            if not math.isfinite(value) or (value and not 1e-130 <= abs(value) < 1e126):
+                raise ValidationError("metadata numbers must be finite and within DynamoDB's range")
+            text = repr(value)
+            self.bytes_left -= len(text)
+            return Decimal(text)
+        raise ValidationError(f"Unsupported metadata value type: {cls.__name__}")
+
+class Validator:
+    """Normalizes ingest payloads using per-service limits"""
+
+    def __init__(self, rules=None, clock=datetime.utcnow):
+        self.rules = rules or {}
+        self._clock = clock
+        self._limits = {}  # service name -> merged limits
+
+    def limits_for(self, service_name):
+        # Services without their own rule share one entry, so the cache stays bounded
+        key = service_name if service_name in self.rules else '*'
+        limits = self._limits.get(key)
+        if limits is None:
+            limits = dict(DEFAULT_LIMITS)
+            limits.update(self.rules.get('*', {}))
+            limits.update(self.rules.get(key, {}))
+            self._limits[key] = limits
+        return limits
+
+    def normalize(self, body):
+        """
+        Return the normalized log fields of a parsed payload (no log_id)
+
+        Raises ValidationError for anything that should not be stored.
+        """
+        missing_fields = [field for field in ('service_name', 'log_type', 'level', 'message') if field not in body]
+        if missing_fields:
+            raise ValidationError(f'Missing required fields: {", ".join(missing_fields)}')
+
+        service_name = _required_string(body, 'service_name')
+        limits = self.limits_for(service_name)
+        entry = {
+            'timestamp': normalize_timestamp(body.get('timestamp'), self._clock(), limits['max_clock_skew_seconds']),
+            'service_name': service_name,
+            'log_type': _required_string(body, 'log_type'),
+            'level': normalize_level(body['level']),
+        }
+
+        message = body['message']
+        if not isinstance(message, str) or not message:
+            raise ValidationError("message must be a non-empty string")
+        max_message_bytes = limits['max_message_bytes']
+        message_bytes = utf8_length(message, 'message')
+        if message_bytes > max_message_bytes:
+            if not limits['truncate_message']:
+                raise ValidationError(f"message exceeds {max_message_bytes} bytes")
+            message = message.encode('utf-8')[:max_message_bytes].decode('utf-8', 'ignore')
+            entry['message_truncated'] = True
+            entry['message_bytes'] = message_bytes
+        entry['message'] = message
+
+        metadata = body.get('metadata')
+        if metadata:
+            if not isinstance(metadata, dict):
+                raise ValidationError("metadata must be an object")
+            entry['metadata'] = _MetadataWalk(limits).normalize(metadata, 0)
+        return entry
+
+def load_validator():
+    """Build the Validator from VALIDATION_LIMITS, checking the limits fit an item"""
+    raw = os.environ.get('VALIDATION_LIMITS', '').strip()
+    rules = json.loads(raw) if raw else {}
+    if not isinstance(rules, dict) or not all(isinstance(rule, dict) for rule in rules.values()):
+        raise ValueError("VALIDATION_LIMITS must be a JSON object of objects")
+    validator = Validator(rules)
+    for service_name in rules:
+        limits = validator.limits_for(service_name)
+        unknown = set(limits) - set(DEFAULT_LIMITS)
+        if unknown:
+            raise ValueError(f"Unknown VALIDATION_LIMITS settings: {', '.join(sorted(unknown))}")
+        for name, value in limits.items():
+            if name == 'truncate_message':
+                if not isinstance(value, bool):
+                    raise ValueError(f"VALIDATION_LIMITS {service_name}.{name} must be true or false")
+            elif not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+                raise ValueError(f"VALIDATION_LIMITS {service_name}.{name} must be a positive integer")
+        if limits['max_message_bytes'] + limits['max_metadata_bytes'] > MAX_ITEM_CONTENT_BYTES:
+            raise ValueError(f"VALIDATION_LIMITS for {service_name} exceed the DynamoDB item size")
+    return validator
@@ -0,0 +1,90 @@
+"""
+Size-bounded LRU cache of log items for the warm read container
+
+Only immutable items are cached. Coalesced items (occurrence_count) keep
+changing while their window is open, so they are read from the store until
+WINDOW_SETTLE_SECONDS after window_end. This margin covers an ingest that
+picked the window just before it closed (the ingest Lambda timeout is 30 s)
+and eventually consistent reads. Coalesced items without window_end are
+never cached. Items carrying a DynamoDB ttl stop being served once it
+passes. Cached items are shared between invocations and must not be
+modified.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from log_store.sketches import parse_timestamp
+
+# Time after window_end before a coalesced item is treated as final
+WINDOW_SETTLE_SECONDS = 60
+
+def is_cacheable(item, now, settle_seconds=WINDOW_SETTLE_SECONDS):
+    """Whether an item can no longer change; now is a naive UTC datetime"""
+    if 'occurrence_count' not in item:
+        return True
+    try:
+        return parse_timestamp(item['window_end']) + timedelta(seconds=settle_seconds) <= now
+    except (KeyError, TypeError, ValueError):
+        # Without a known window the item may still be updated
+        return False
+
+class LogItemCache:
+    """LRU cache keyed by log_id, bounded by the encoded size of its items"""
+
+    def __init__(self, max_bytes, settle_seconds=WINDOW_SETTLE_SECONDS, clock=time.time):
+        self.max_bytes = max_bytes
+        self.settle_seconds = settle_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # log_id -> (item, size)
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, log_ids):
+        """Return {log_id: item} for the cached IDs, marking them recently used"""
+        now = self._clock()
+        found = {}
+        with self._lock:
+            for log_id in log_ids:
+                entry = self._items.get(log_id)
+                if entry is not None:
+                    ttl = entry[0].get('ttl')
+                    if ttl is not None and ttl < now:
+                        self._remove_locked(log_id)
+                        entry = None
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._items.move_to_end(log_id)
+                found[log_id] = entry[0]
+                self.hits += 1
+        return found
+
+    def put_many(self, items, encoder=None):
+        """Cache the immutable items, evicting least recently used ones"""
+        now = datetime.utcfromtimestamp(self._clock())
+        for item in items:
+            if not is_cacheable(item, now, self.settle_seconds):
+                continue
+            size = len(json.dumps(item, default=encoder))
+            if size > self.max_bytes:
+                continue
+            with self._lock:
+                if item['log_id'] in self._items:
+                    self._remove_locked(item['log_id'])
+                self._items[item['log_id']] = (item, size)
+                self.size_bytes += size
+                while self.size_bytes > self.max_bytes:
+                    self._remove_locked(next(iter(self._items)))
+
+    def _remove_locked(self, log_id):
+        _, size = self._items.pop(log_id)
+        self.size_bytes -= size
+
+    def __len__(self):
+        return len(self._items)
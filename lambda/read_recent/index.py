@@ -1,21 +1,257 @@
+import base64
+import binascii
 import json
 import os
 from datetime import datetime, timedelta
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
+from decimal import Decimal
 from botocore.exceptions import ClientError
+from log_store import get_indexed_attributes, get_log_store
+from log_store.sketches import (DISTINCT_PREFIX, PERCENTILE_PREFIX, bucket_for, load_sketch,
+                                parse_timestamp)
+from cache import LogItemCache
 
 # Get table name from environment variable
 TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
 
+# Metadata keys promoted by ingest and indexed by sparse GSIs
+INDEXED_ATTRIBUTES = get_indexed_attributes()
+
+DEFAULT_PERCENTILES = '50,90,99'
+MAX_BATCH_IDS = 1000
+
+# Immutable log items cached across warm invocations, bounded by encoded size (0 disables)
+LOG_CACHE = LogItemCache(int(os.environ.get('LOG_CACHE_MAX_BYTES', 16 * 1024 * 1024)))
+MAX_ANALYTICS_HOURS = 24 * 366
+
 def get_dynamodb_table():
-    """Get DynamoDB table resource - allows for easier mocking in tests"""
-    dynamodb = boto3.resource('dynamodb')
-    return dynamodb.Table(TABLE_NAME)
+    """Get the LogStore for the configured backend - allows for easier mocking in tests"""
+    return get_log_store(TABLE_NAME)
+
+def json_default(value):
+    """Render DynamoDB numbers (Decimal) as JSON numbers; anything else as a string"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+def encode_next_token(key, value, start_key):
+    """Opaque continuation token for a lookup page, bound to the looked-up key and value"""
+    if start_key is None:
+        return None
+    token = json.dumps({'key': key, 'value': value, 'start': start_key}, default=json_default)
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_next_token(token, key, value):
+    """start_key from a token issued for the same lookup; None if invalid"""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(decoded, dict) or decoded.get('key') != key or decoded.get('value') != value \
+            or not isinstance(decoded.get('start'), dict):
+        return None
+    return decoded['start']
+
+def parse_limit(params):
+    """Get limit parameter (default 100, max 1000); None if invalid"""
+    try:
+        limit = int(params.get('limit', 100))
+        return min(max(1, limit), 1000)  # Clamp between 1 and 1000
+    except (ValueError, TypeError):
+        return None
+
+def lookup_logs(params):
+    """
+    GET /logs/lookup - all logs carrying one indexed metadata value
+    
+    Query parameters:
+    - exactly one indexed metadata key, e.g. trace_id=abc or request_id=xyz
+    - limit: Maximum number of logs to return (default: 100, max: 1000)
+    - next_token: next_token from the previous page
+    
+    next_token is null once every log has been returned.
+    """
+    keys = [key for key in params if key in INDEXED_ATTRIBUTES]
+    if len(keys) != 1 or not params[keys[0]]:
+        if INDEXED_ATTRIBUTES:
+            error = f"Specify exactly one of: {', '.join(INDEXED_ATTRIBUTES)}"
+        else:
+            error = 'No metadata keys are indexed'
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': error})
+        }
+    
+    limit = parse_limit(params)
+    if limit is None:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid limit parameter'})
+        }
+    
+    key = keys[0]
+    start_key = None
+    if params.get('next_token'):
+        start_key = decode_next_token(params['next_token'], key, params[key])
+        if start_key is None:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Invalid next_token parameter'})
+            }
+    
+    # Single Query against the attribute's sparse GSI (newest first)
+    store = get_dynamodb_table()
+    items, next_key = store.query_by_attribute(key, params[key], limit, start_key=start_key)
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'count': len(items),
+            'total_occurrences': sum(int(item.get('occurrence_count', 1)) for item in items),
+            key: params[key],
+            'logs': items,
+            'next_token': encode_next_token(key, params[key], next_key)
+        }, default=json_default)
+    }
+
+def get_logs_by_id(params):
+    """
+    GET /logs?ids=... - logs by log_id, in the order requested
+    
+    Query parameters:
+    - ids: Comma separated log IDs (required, max 1000); duplicates are ignored
+    """
+    log_ids = list(dict.fromkeys(log_id.strip() for log_id in params.get('ids', '').split(',') if log_id.strip()))
+    if not log_ids:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'ids is required'})
+        }
+    if len(log_ids) > MAX_BATCH_IDS:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'At most {MAX_BATCH_IDS} ids per request'})
+        }
+    
+    # Repeat hits (e.g. everyone opening the same alert) are served from the warm cache
+    found = LOG_CACHE.get_many(log_ids)
+    uncached = [log_id for log_id in log_ids if log_id not in found]
+    if uncached:
+        fetched = get_dynamodb_table().get_batch(uncached)
+        LOG_CACHE.put_many(fetched.values(), encoder=json_default)
+        found.update(fetched)
+    print(f"Batch lookup: {len(log_ids)} ids, {len(log_ids) - len(uncached)} from cache")
+    
+    items = [found[log_id] for log_id in log_ids if log_id in found]
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'count': len(items),
+            'total_occurrences': sum(int(item.get('occurrence_count', 1)) for item in items),
+            'logs': items,
+            'missing': [log_id for log_id in log_ids if log_id not in found]
+        }, default=json_default)
+    }
+
+def parse_percentiles(value):
+    """Percentiles like '50,99.9' as floats in 0..100; None if invalid"""
+    try:
+        percentiles = [float(p) for p in value.split(',') if p.strip()]
+    except ValueError:
+        return None
+    if not percentiles or any(not 0 <= p <= 100 for p in percentiles):
+        return None
+    return percentiles
+
+def analytics(params):
+    """
+    GET /logs/analytics - approximate distinct counts and percentiles
+    
+    Merges the service's hourly sketches across the range in constant memory.
+    
+    Query parameters:
+    - service_name: Service to report on (required)
+    - start, end: ISO 8601 range (optional; end defaults to now)
+    - hours: Number of hour buckets up to end when start is not given (default: 24)
+    - percentiles: Comma separated percentiles (default: 50,90,99)
+    """
+    service_name = params.get('service_name')
+    if not service_name:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'service_name is required'})
+        }
+    
+    percentiles = parse_percentiles(params.get('percentiles', DEFAULT_PERCENTILES))
+    if percentiles is None:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid percentiles parameter'})
+        }
+    
+    try:
+        end = parse_timestamp(params['end']) if params.get('end') else datetime.utcnow()
+        if params.get('start'):
+            start = parse_timestamp(params['start'])
+        else:
+            hours = min(max(1, int(params.get('hours', 24))), MAX_ANALYTICS_HOURS)
+            start = end - timedelta(hours=hours - 1)
+    except (ValueError, TypeError):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid time range'})
+        }
+    
+    start_bucket, end_bucket = bucket_for(start), bucket_for(end)
+    if start_bucket > end_bucket:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'start must not be after end'})
+        }
+    
+    # Fold buckets one at a time: memory stays at one sketch per field
+    store = get_dynamodb_table()
+    merged = {}
+    buckets = 0
+    log_count = 0
+    for stored in store.query_sketches(service_name, start_bucket, end_bucket):
+        buckets += 1
+        log_count += stored['log_count']
+        for name, data in stored['sketches'].items():
+            sketch = load_sketch(data)
+            if name in merged:
+                merged[name].merge(sketch)
+            else:
+                merged[name] = sketch
+    
+    distinct = {}
+    percentile_results = {}
+    for name, sketch in sorted(merged.items()):
+        if name.startswith(DISTINCT_PREFIX):
+            distinct[name[len(DISTINCT_PREFIX):]] = sketch.estimate()
+        elif name.startswith(PERCENTILE_PREFIX):
+            summary = {'count': int(sketch.count), 'min': sketch.min, 'max': sketch.max}
+            for p in percentiles:
+                summary[f'p{p:g}'] = sketch.quantile(p / 100)
+            percentile_results[name[len(PERCENTILE_PREFIX):]] = summary
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'service_name': service_name,
+            'start': start_bucket,
+            'end': end_bucket,
+            'buckets': buckets,
+            'log_count': log_count,
+            'distinct': distinct,
+            'percentiles': percentile_results
+        })
+    }
 
 def lambda_handler(event, context):
     """
     Lambda handler for retrieving recent log entries
+    (GET /logs is routed to get_logs_by_id, GET /logs/lookup to lookup_logs
+    and GET /logs/analytics to analytics)
     
     Query parameters:
     - limit: Maximum number of logs to return (default: 100, max: 1000)
@@ -23,16 +259,23 @@ def lambda_handler(event, context):
     - log_type: Filter by log type (optional)
     - level: Filter by log level (optional)
     - hours: Number of hours to look back (default: 24)
+    - coalesced: 'true' to return only coalesced (repeated-message) entries (optional)
     """
     try:
         # Parse query parameters
         params = event.get('queryStringParameters') or {}
         
-        # Get limit parameter (default 100, max 1000)
-        try:
-            limit = int(params.get('limit', 100))
-            limit = min(max(1, limit), 1000)  # Clamp between 1 and 1000
-        except (ValueError, TypeError):
+        if event.get('resource') == '/logs':
+            return get_logs_by_id(params)
+        
+        if event.get('resource') == '/logs/lookup':
+            return lookup_logs(params)
+        
+        if event.get('resource') == '/logs/analytics':
+            return analytics(params)
+        
+        limit = parse_limit(params)
+        if limit is None:
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': 'Invalid limit parameter'})
@@ -48,39 +291,27 @@ def lambda_handler(event, context):
         # Calculate cutoff timestamp
         cutoff_time = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
         
-        # Scan table with filters
-        table = get_dynamodb_table()
-        scan_kwargs = {
-            'Limit': limit,
-            'FilterExpression': Attr('timestamp').gte(cutoff_time)
-        }
-        
-        # Add optional filters
-        if 'service_name' in params:
-            scan_kwargs['FilterExpression'] &= Attr('service_name').eq(params['service_name'])
-        
-        if 'log_type' in params:
-            scan_kwargs['FilterExpression'] &= Attr('log_type').eq(params['log_type'])
-        
-        if 'level' in params:
-            scan_kwargs['FilterExpression'] &= Attr('level').eq(params['level'].upper())
-        
-        # Execute scan
-        response = table.scan(**scan_kwargs)
-        items = response.get('Items', [])
-        
-        # Sort by timestamp descending (newest first)
-        items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        # Query the log store with optional filters (newest first)
+        store = get_dynamodb_table()
+        items = store.query_recent(
+            cutoff_time,
+            limit,
+            service_name=params.get('service_name'),
+            log_type=params.get('log_type'),
+            level=params['level'].upper() if 'level' in params else None,
+            coalesced_only=str(params.get('coalesced', '')).lower() == 'true'
+        )
         
-        # Limit results
-        items = items[:limit]
+        # Coalesced entries stand for occurrence_count log lines each
+        total_occurrences = sum(int(item.get('occurrence_count', 1)) for item in items)
         
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'count': len(items),
+                'total_occurrences': total_occurrences,
                 'logs': items
-            }, default=str)  # default=str handles datetime serialization
+            }, default=json_default)
         }
         
     except ClientError as e:
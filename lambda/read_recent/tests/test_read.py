@@ -8,9 +8,12 @@ from datetime import datetime, timedelta
 
 # Add the parent directory to the path to allow imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Shared layer code (log_store) is on the Lambda path via the layer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'shared', 'python'))
 
 # Set environment variable before importing the handler
 os.environ['DYNAMODB_TABLE_NAME'] = 'test-logs-table'
+os.environ['SKETCH_TABLE_NAME'] = 'test-sketches-table'
 
 # Import the handler using importlib to avoid 'lambda' keyword issue
 import importlib.util
@@ -19,6 +22,9 @@ read_module = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(read_module)
 lambda_handler = read_module.lambda_handler
 
+from log_store.sketches import HyperLogLog, TDigest
+from cache import LogItemCache
+
 @pytest.fixture
 def aws_credentials():
     """Mocked AWS Credentials for moto"""
@@ -170,3 +176,294 @@ def test_read_recent_logs_no_results(dynamodb_table_with_data):
         assert body['count'] == 0
         assert len(body['logs']) == 0
 
+
+def test_read_recent_logs_coalesced_entries(dynamodb_table_with_data):
+    """Test coalesced entries are returned with their counts"""
+    with mock_aws():
+        dynamodb_table_with_data.put_item(Item={
+            'log_id': 'log-coalesced',
+            'timestamp': (datetime.utcnow() - timedelta(minutes=1)).isoformat(),
+            'service_name': 'test-service',
+            'log_type': 'application',
+            'level': 'ERROR',
+            'message': 'Connection refused to 10.0.0.1',
+            'message_template': 'Connection refused to <IP>',
+            'occurrence_count': 42
+        })
+        
+        response = lambda_handler({'queryStringParameters': None}, None)
+        body = json.loads(response['body'])
+        assert body['count'] == 4
+        assert body['total_occurrences'] == 45
+        
+        response = lambda_handler({'queryStringParameters': {'coalesced': 'true'}}, None)
+        body = json.loads(response['body'])
+        assert body['count'] == 1
+        assert body['logs'][0]['occurrence_count'] == 42
+
+@pytest.fixture
+def dynamodb_table_with_trace_index(aws_credentials):
+    """Create a mocked DynamoDB table with a sparse trace_id GSI"""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        
+        table = dynamodb.create_table(
+            TableName='test-logs-table',
+            KeySchema=[
+                {'AttributeName': 'log_id', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'log_id', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'S'},
+                {'AttributeName': 'trace_id', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': 'trace-id-index',
+                    'KeySchema': [
+                        {'AttributeName': 'trace_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                }
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        table.meta.client.get_waiter('table_exists').wait(TableName='test-logs-table')
+        
+        current_time = datetime.utcnow()
+        for i in range(5):
+            item = {
+                'log_id': f'log-{i}',
+                'timestamp': (current_time - timedelta(minutes=i)).isoformat(),
+                'service_name': f'service-{i}',
+                'log_type': 'application',
+                'level': 'INFO',
+                'message': f'Hop {i}'
+            }
+            if i < 3:
+                item['trace_id'] = 'trace-abc'
+            table.put_item(Item=item)
+        
+        yield table
+
+def test_lookup_logs_by_trace_id(dynamodb_table_with_trace_index, monkeypatch):
+    """Test lookup returns every log for a trace, newest first"""
+    monkeypatch.setattr(read_module, 'INDEXED_ATTRIBUTES', ('trace_id', 'request_id'))
+    with mock_aws():
+        event = {
+            'resource': '/logs/lookup',
+            'queryStringParameters': {'trace_id': 'trace-abc'}
+        }
+        
+        response = lambda_handler(event, None)
+        
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['count'] == 3
+        assert body['trace_id'] == 'trace-abc'
+        assert [log['log_id'] for log in body['logs']] == ['log-0', 'log-1', 'log-2']
+        assert body['next_token'] is None
+
+def test_lookup_logs_pages_with_next_token(dynamodb_table_with_trace_index, monkeypatch):
+    """Test lookups past limit return a next_token that continues where the page ended"""
+    monkeypatch.setattr(read_module, 'INDEXED_ATTRIBUTES', ('trace_id', 'request_id'))
+    with mock_aws():
+        params = {'trace_id': 'trace-abc', 'limit': '2'}
+        
+        response = lambda_handler({'resource': '/logs/lookup', 'queryStringParameters': params}, None)
+        
+        body = json.loads(response['body'])
+        assert [log['log_id'] for log in body['logs']] == ['log-0', 'log-1']
+        assert body['next_token']
+        
+        params['next_token'] = body['next_token']
+        response = lambda_handler({'resource': '/logs/lookup', 'queryStringParameters': params}, None)
+        
+        body = json.loads(response['body'])
+        assert [log['log_id'] for log in body['logs']] == ['log-2']
+        assert body['next_token'] is None
+        
+        # Tokens only continue the lookup they were issued for
+        for token_params in ({'trace_id': 'other-trace', 'next_token': params['next_token']},
+                             {'trace_id': 'trace-abc', 'next_token': 'not-a-token'}):
+            response = lambda_handler({'resource': '/logs/lookup', 'queryStringParameters': token_params}, None)
+            assert response['statusCode'] == 400
+
+def test_lookup_logs_requires_one_indexed_key(dynamodb_table_with_trace_index, monkeypatch):
+    """Test lookup rejects requests without exactly one indexed key"""
+    monkeypatch.setattr(read_module, 'INDEXED_ATTRIBUTES', ('trace_id', 'request_id'))
+    with mock_aws():
+        for params in (None, {'user_id': '1'}, {'trace_id': 'a', 'request_id': 'b'}):
+            event = {'resource': '/logs/lookup', 'queryStringParameters': params}
+            
+            response = lambda_handler(event, None)
+            
+            assert response['statusCode'] == 400
+            assert 'trace_id' in json.loads(response['body'])['error']
+
+@pytest.fixture
+def dynamodb_sketch_table(aws_credentials):
+    """Create a mocked sketch table with three hourly buckets"""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        
+        table = dynamodb.create_table(
+            TableName='test-sketches-table',
+            KeySchema=[
+                {'AttributeName': 'service_name', 'KeyType': 'HASH'},
+                {'AttributeName': 'bucket', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'service_name', 'AttributeType': 'S'},
+                {'AttributeName': 'bucket', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        table.meta.client.get_waiter('table_exists').wait(TableName='test-sketches-table')
+        
+        # Hour h has request IDs 0..(h+1)*100 and durations 1..1000
+        for hour in range(3):
+            requests = HyperLogLog()
+            for i in range((hour + 1) * 100):
+                requests.add(f'req-{i}')
+            durations = TDigest()
+            for ms in range(1, 1001):
+                durations.add(ms)
+            table.put_item(Item={
+                'service_name': 'checkout',
+                'bucket': f'2026-02-02T1{hour}',
+                'log_count': 1000,
+                'version': 1,
+                'distinct:request_id': requests.to_bytes(),
+                'percentiles:duration_ms': durations.to_bytes()
+            })
+        
+        yield table
+
+def test_analytics_merges_buckets_in_range(dynamodb_sketch_table):
+    """Test analytics merges the buckets between start and end"""
+    with mock_aws():
+        event = {
+            'resource': '/logs/analytics',
+            'queryStringParameters': {
+                'service_name': 'checkout',
+                'start': '2026-02-02T11:00:00Z',
+                'end': '2026-02-02T13:00:00Z',
+                'percentiles': '50,99'
+            }
+        }
+        
+        response = lambda_handler(event, None)
+        
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert (body['start'], body['end']) == ('2026-02-02T11', '2026-02-02T13')
+        assert body['buckets'] == 2
+        assert body['log_count'] == 2000
+        # Request IDs overlap across hours, so the union is the larger hour
+        assert body['distinct']['request_id'] == pytest.approx(300, rel=0.05)
+        durations = body['percentiles']['duration_ms']
+        assert durations['count'] == 2000
+        assert durations['p50'] == pytest.approx(500, rel=0.02)
+        assert durations['p99'] == pytest.approx(990, rel=0.02)
+
+def test_analytics_validates_parameters(dynamodb_sketch_table):
+    """Test analytics rejects missing service, bad percentiles and inverted ranges"""
+    with mock_aws():
+        for params in (
+            None,
+            {'service_name': 'checkout', 'percentiles': '101'},
+            {'service_name': 'checkout', 'start': 'yesterday'},
+            {'service_name': 'checkout', 'start': '2026-02-02T12:00:00Z', 'end': '2026-02-02T10:00:00Z'}
+        ):
+            event = {'resource': '/logs/analytics', 'queryStringParameters': params}
+            
+            response = lambda_handler(event, None)
+            
+            assert response['statusCode'] == 400
+
+def test_get_logs_by_id_batches_and_caches(dynamodb_table_with_data, monkeypatch):
+    """Test GET /logs?ids= returns logs in request order and serves repeats from the cache"""
+    cache = LogItemCache(1024 * 1024)
+    monkeypatch.setattr(read_module, 'LOG_CACHE', cache)
+    with mock_aws():
+        with dynamodb_table_with_data.batch_writer() as batch:
+            for i in range(250):
+                batch.put_item(Item={
+                    'log_id': f'bulk-{i}',
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'service_name': 'bulk-service',
+                    'log_type': 'application',
+                    'level': 'INFO',
+                    'message': f'Bulk log {i}'
+                })
+        requested = ['log-2', 'unknown-id'] + [f'bulk-{i}' for i in range(250)] + ['log-2']
+        event = {'resource': '/logs', 'queryStringParameters': {'ids': ','.join(requested)}}
+        
+        response = lambda_handler(event, None)
+        
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['count'] == 251
+        assert body['logs'][0]['log_id'] == 'log-2'
+        assert body['logs'][-1]['log_id'] == 'bulk-249'
+        assert body['missing'] == ['unknown-id']
+        assert len(cache) == 251
+        
+        # Repeat hits are served from the cache even if the store changes
+        dynamodb_table_with_data.delete_item(Key={'log_id': 'log-2'})
+        response = lambda_handler({'resource': '/logs', 'queryStringParameters': {'ids': 'log-2'}}, None)
+        body = json.loads(response['body'])
+        assert body['logs'][0]['message'] == 'Test log 2'
+        assert cache.hits == 1
+
+def test_get_logs_by_id_requires_ids(dynamodb_table_with_data):
+    """Test GET /logs rejects missing or too many ids"""
+    with mock_aws():
+        for params in (None, {'ids': ' , '}, {'ids': ','.join(f'id-{i}' for i in range(1001))}):
+            response = lambda_handler({'resource': '/logs', 'queryStringParameters': params}, None)
+            
+            assert response['statusCode'] == 400
+
+def test_log_item_cache_bounds_and_expiry():
+    """Test the cache evicts least recently used items, skips coalesced items and honours ttl"""
+    now = [1000.0]
+    item_size = len(json.dumps({'log_id': 'a', 'message': 'x' * 100}))
+    cache = LogItemCache(item_size * 2, clock=lambda: now[0])
+    
+    cache.put_many([{'log_id': 'a', 'message': 'x' * 100}, {'log_id': 'b', 'message': 'x' * 100}])
+    assert sorted(cache.get_many(['a'])) == ['a']
+    cache.put_many([{'log_id': 'c', 'message': 'x' * 100}])
+    assert sorted(cache.get_many(['a', 'b', 'c'])) == ['a', 'c']
+    assert cache.size_bytes <= cache.max_bytes
+    
+    cache.put_many([{'log_id': 'd', 'occurrence_count': 3}, {'log_id': 'e', 'ttl': 1500}])
+    assert 'd' not in cache.get_many(['d'])
+    assert 'e' in cache.get_many(['e'])
+    now[0] = 2000.0
+    assert cache.get_many(['e']) == {}
+
+def test_log_item_cache_stores_closed_coalesced_items():
+    """Test coalesced items are cached only once their window has closed and settled"""
+    now = datetime(2026, 2, 2, 10, 30)
+    cache = LogItemCache(1024 * 1024, clock=lambda: (now - datetime(1970, 1, 1)).total_seconds())
+    
+    def coalesced(log_id, **times):
+        item = {'log_id': log_id, 'occurrence_count': 3}
+        item.update({name: (now + offset).isoformat() + 'Z' for name, offset in times.items()})
+        return item
+    
+    cache.put_many([
+        coalesced('open-window', window_end=timedelta(seconds=30)),
+        # Closed, but a late UpdateItem or an eventually consistent read may still be pending
+        coalesced('just-closed', window_end=timedelta(seconds=-1)),
+        coalesced('settled', window_end=timedelta(seconds=-61)),
+        # last_seen comes from the client, so it never makes an item cacheable
+        coalesced('no-window', last_seen=timedelta(days=-1)),
+        coalesced('backfilled', last_seen=timedelta(days=-1), window_end=timedelta(seconds=30)),
+    ])
+    
+    assert sorted(cache.get_many(['open-window', 'just-closed', 'settled', 'no-window', 'backfilled'])) == ['settled']
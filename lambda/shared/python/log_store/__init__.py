@@ -0,0 +1,119 @@
+"""
+Pluggable log storage shared by the Lambda handlers (deployed as a Lambda layer)
+
+The backend is chosen with LOG_STORE_BACKEND:
+- dynamodb (default): the DynamoDB logs table
+- segment: embedded append-only segment files under LOG_STORE_PATH, for
+  self-hosted deployments (see scripts/local_api.py)
+
+Segment backend settings:
+- LOG_STORE_PATH: data directory (required)
+- LOG_STORE_SEGMENT_RECORDS: records per sealed segment (default 10000)
+- LOG_STORE_RETENTION_HOURS: expire records older than this (default: keep forever)
+- LOG_STORE_COMPACTION_SECONDS: background compaction interval, 0 disables (default 300)
+- LOG_STORE_FSYNC: "true" fsyncs every append before the write is acknowledged
+  (default false: appends are flushed to the OS page cache only, so a host crash
+  or power loss can drop the most recent writes; a process crash cannot)
+
+The segment backend needs a POSIX filesystem: compaction removes segment
+files that readers may still have open or memory-mapped, which Windows refuses.
+
+DynamoDB analytics sketches are kept in the table named by SKETCH_TABLE_NAME
+(hash key service_name, range key bucket); the segment backend keeps them
+under LOG_STORE_PATH.
+
+INDEXED_METADATA_KEYS (comma separated, e.g. "trace_id,request_id") lists
+metadata keys that ingest promotes to top-level attributes. On DynamoDB
+each one has a sparse GSI named by index_name(); the segment backend adds
+them to its bloom filters.
+"""
+
+import os
+import threading
+from datetime import timedelta
+
+from log_store.base import LogStore
+
+BACKENDS = ('dynamodb', 'segment')
+
+# Attributes written by ingest that a promoted metadata key may not shadow
+CORE_ATTRIBUTES = frozenset({
+    'log_id', 'timestamp', 'service_name', 'log_type', 'level', 'message', 'metadata', 'ttl',
+    'message_truncated', 'message_bytes'
+})
+
+# Stores are cached per container so warm invocations reuse clients and open segments
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_backend_name():
+    """Return the configured backend name"""
+    backend = os.environ.get('LOG_STORE_BACKEND', 'dynamodb').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LOG_STORE_BACKEND: {backend}")
+    return backend
+
+def get_indexed_attributes():
+    """Return the metadata keys promoted to indexed top-level attributes"""
+    raw = os.environ.get('INDEXED_METADATA_KEYS', '')
+    keys = tuple(key.strip() for key in raw.split(',') if key.strip())
+    shadowed = CORE_ATTRIBUTES.intersection(keys)
+    if shadowed:
+        raise ValueError(f"INDEXED_METADATA_KEYS cannot include core attributes: {', '.join(sorted(shadowed))}")
+    return keys
+
+def index_name(attribute):
+    """GSI name for a promoted attribute, matching terraform/dynamodb.tf"""
+    return f"{attribute.replace('_', '-')}-index"
+
+def get_log_store(table_name=None):
+    """Return the LogStore for the configured backend, creating it on first use"""
+    backend = get_backend_name()
+
+    if backend == 'dynamodb':
+        if not table_name:
+            raise ValueError("DynamoDB backend requires a table name")
+        key = (backend, table_name)
+    else:
+        path = os.environ.get('LOG_STORE_PATH')
+        if not path:
+            raise ValueError("LOG_STORE_PATH environment variable is not set")
+        key = (backend, os.path.abspath(path))
+
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _create_store(backend, key[1])
+            _stores[key] = store
+        return store
+
+def _create_store(backend, location):
+    if backend == 'dynamodb':
+        from log_store.dynamodb import DynamoDBLogStore
+        return DynamoDBLogStore(location, sketch_table_name=os.environ.get('SKETCH_TABLE_NAME'))
+
+    from log_store.segment import SegmentLogStore
+    retention_hours = os.environ.get('LOG_STORE_RETENTION_HOURS')
+    store = SegmentLogStore(
+        location,
+        segment_max_records=int(os.environ.get('LOG_STORE_SEGMENT_RECORDS', 10000)),
+        indexed_attributes=get_indexed_attributes(),
+        retention=timedelta(hours=float(retention_hours)) if retention_hours else None,
+        fsync=os.environ.get('LOG_STORE_FSYNC', '').lower() == 'true'
+    )
+    interval = float(os.environ.get('LOG_STORE_COMPACTION_SECONDS', 300))
+    if interval > 0:
+        store.start_maintenance(interval)
+    return store
+
+def reset_stores():
+    """Close and forget cached stores (used by tests and the local emulator)"""
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
+
+__all__ = [
+    'LogStore', 'BACKENDS', 'CORE_ATTRIBUTES', 'get_backend_name', 'get_indexed_attributes',
+    'get_log_store', 'index_name', 'reset_stores'
+]
@@ -0,0 +1,92 @@
+from abc import ABC, abstractmethod
+
+def merge_coalesced(existing, update):
+    """
+    Fold one coalesced record into another
+
+    Counts are added, first_seen/timestamp keep the earliest value and
+    last_seen the latest; other attributes keep the existing values.
+    """
+    merged = dict(existing)
+    merged['occurrence_count'] = existing.get('occurrence_count', 1) + update.get('occurrence_count', 1)
+    if 'weighted_count' in existing or 'weighted_count' in update:
+        merged['weighted_count'] = existing.get('weighted_count', 0) + update.get('weighted_count', 0)
+    for key in ('first_seen', 'timestamp'):
+        if key in update and (key not in existing or update[key] < existing[key]):
+            merged[key] = update[key]
+    if update.get('last_seen', '') > existing.get('last_seen', ''):
+        merged['last_seen'] = update['last_seen']
+    return merged
+
+class LogStore(ABC):
+    """
+    Storage interface used by the Lambda handlers
+
+    Items are plain dicts with at least log_id, timestamp (ISO 8601 string),
+    service_name, log_type, level and message.
+    """
+
+    @abstractmethod
+    def put(self, item):
+        """Store a single log item"""
+
+    def put_batch(self, items):
+        """Store several log items; backends override this with a bulk write"""
+        for item in items:
+            self.put(item)
+
+    @abstractmethod
+    def upsert_coalesced(self, item, seen_at, weight=None):
+        """
+        Count one more occurrence of a coalesced item keyed by item['log_id']
+
+        The first call stores the item with occurrence_count 1; later calls
+        increment occurrence_count (and weighted_count by `weight`) and set
+        last_seen to `seen_at`. Returns the occurrence count now stored.
+        """
+
+    @abstractmethod
+    def get_batch(self, log_ids):
+        """
+        Return {log_id: item} for the given IDs; IDs that do not exist are
+        left out
+        """
+
+    @abstractmethod
+    def query_recent(self, since, limit, service_name=None, log_type=None, level=None,
+                     coalesced_only=False):
+        """
+        Return up to `limit` items with timestamp >= `since`, newest first
+
+        Optional service_name, log_type and level arguments filter on exact
+        match; coalesced_only restricts results to coalesced items.
+        """
+
+    @abstractmethod
+    def query_by_attribute(self, name, value, limit, start_key=None):
+        """
+        Return (items, next_key): up to `limit` items whose promoted
+        attribute `name` equals `value`, newest first
+
+        next_key is a JSON-serializable dict to pass back as start_key for
+        the following page, or None when there are no more items.
+        """
+
+    @abstractmethod
+    def merge_sketches(self, service_name, bucket, sketches, log_count):
+        """
+        Merge serialized sketches ({attribute name: bytes}, see
+        log_store.sketches) into the stored (service_name, bucket) item and
+        add log_count to its count, creating the item if needed
+        """
+
+    @abstractmethod
+    def query_sketches(self, service_name, start_bucket, end_bucket):
+        """
+        Yield the stored sketch buckets of a service from start_bucket to
+        end_bucket inclusive, oldest first, as dicts with bucket, log_count
+        and sketches
+        """
+
+    def close(self):
+        """Release any resources held by the store"""
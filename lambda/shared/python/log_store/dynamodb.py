@@ -0,0 +1,198 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from log_store import index_name
+from log_store.base import LogStore
+from log_store.sketches import SKETCH_PREFIXES, merge_sketch_attributes
+
+# Optimistic merge retries when concurrent containers update the same sketch bucket
+SKETCH_MERGE_ATTEMPTS = 10
+
+# BatchGetItem accepts at most 100 keys per request; chunks are fetched concurrently
+BATCH_GET_KEYS = 100
+BATCH_GET_WORKERS = 8
+BATCH_GET_ATTEMPTS = 8
+BATCH_GET_BACKOFF_SECONDS = 0.05
+
+class DynamoDBLogStore(LogStore):
+    """LogStore backed by the DynamoDB logs table (the default backend)"""
+
+    def __init__(self, table_name, sketch_table_name=None):
+        self.table_name = table_name
+        self.sketch_table_name = sketch_table_name
+        self._table = None
+        self._sketch_table = None
+
+    @property
+    def table(self):
+        """Table resource, created once per container and reused while warm"""
+        if self._table is None:
+            dynamodb = boto3.resource('dynamodb')
+            self._table = dynamodb.Table(self.table_name)
+        return self._table
+
+    @property
+    def sketch_table(self):
+        """Sketch table resource (hash key service_name, range key bucket)"""
+        if self._sketch_table is None:
+            if not self.sketch_table_name:
+                raise ValueError("SKETCH_TABLE_NAME environment variable is not set")
+            dynamodb = boto3.resource('dynamodb')
+            self._sketch_table = dynamodb.Table(self.sketch_table_name)
+        return self._sketch_table
+
+    def put(self, item):
+        self.table.put_item(Item=item)
+
+    def put_batch(self, items):
+        with self.table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+    def upsert_coalesced(self, item, seen_at, weight=None):
+        # Single atomic UpdateItem: attributes are only set on first sight, counters always advance
+        names = {}
+        values = {':one': 1, ':seen': seen_at}
+        set_parts = ['last_seen = :seen']
+        for i, (key, value) in enumerate(item.items()):
+            if key in ('log_id', 'last_seen', 'occurrence_count', 'weighted_count'):
+                continue
+            names[f'#a{i}'] = key
+            values[f':v{i}'] = value
+            set_parts.append(f'#a{i} = if_not_exists(#a{i}, :v{i})')
+
+        add_parts = ['occurrence_count :one']
+        if weight is not None:
+            values[':weight'] = weight
+            add_parts.append('weighted_count :weight')
+
+        response = self.table.update_item(
+            Key={'log_id': item['log_id']},
+            UpdateExpression=f"SET {', '.join(set_parts)} ADD {', '.join(add_parts)}",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(response['Attributes']['occurrence_count'])
+
+    def get_batch(self, log_ids):
+        log_ids = list(dict.fromkeys(log_ids))
+        chunks = [log_ids[i:i + BATCH_GET_KEYS] for i in range(0, len(log_ids), BATCH_GET_KEYS)]
+        # The resource's client is thread-safe (resources are not) and still (de)serializes DynamoDB types
+        client = self.table.meta.client
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(BATCH_GET_WORKERS, len(chunks))) as pool:
+                results = list(pool.map(lambda chunk: self._get_chunk(client, chunk), chunks))
+        else:
+            results = [self._get_chunk(client, chunk) for chunk in chunks]
+        return {item['log_id']: item for items in results for item in items}
+
+    def _get_chunk(self, client, log_ids):
+        """BatchGetItem one chunk, retrying UnprocessedKeys with jittered exponential backoff"""
+        request = {self.table_name: {'Keys': [{'log_id': log_id} for log_id in log_ids]}}
+        items = []
+        for attempt in range(BATCH_GET_ATTEMPTS):
+            response = client.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(self.table_name, []))
+            request = response.get('UnprocessedKeys')
+            if not request:
+                return items
+            time.sleep(random.uniform(0, BATCH_GET_BACKOFF_SECONDS * 2 ** attempt))
+        unprocessed = len(request[self.table_name]['Keys'])
+        raise RuntimeError(f"BatchGetItem left {unprocessed} keys unprocessed after {BATCH_GET_ATTEMPTS} attempts")
+
+    def query_by_attribute(self, name, value, limit, start_key=None):
+        # Sparse GSI per promoted attribute: only items carrying it are indexed
+        query_kwargs = {
+            'IndexName': index_name(name),
+            'KeyConditionExpression': Key(name).eq(value),
+            'ScanIndexForward': False,
+            'Limit': limit
+        }
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+        items = []
+        next_key = None
+        while len(items) < limit:
+            response = self.table.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            next_key = response.get('LastEvaluatedKey')
+            if next_key is None:
+                break
+            query_kwargs['ExclusiveStartKey'] = next_key
+            query_kwargs['Limit'] = limit - len(items)
+        # Key attributes of the GSI and table are strings, so the key is JSON-serializable
+        return items[:limit], next_key
+
+    def query_recent(self, since, limit, service_name=None, log_type=None, level=None,
+                     coalesced_only=False):
+        scan_kwargs = {
+            'Limit': limit,
+            'FilterExpression': Attr('timestamp').gte(since)
+        }
+
+        # Add optional filters
+        if service_name is not None:
+            scan_kwargs['FilterExpression'] &= Attr('service_name').eq(service_name)
+
+        if log_type is not None:
+            scan_kwargs['FilterExpression'] &= Attr('log_type').eq(log_type)
+
+        if level is not None:
+            scan_kwargs['FilterExpression'] &= Attr('level').eq(level)
+
+        if coalesced_only:
+            scan_kwargs['FilterExpression'] &= Attr('occurrence_count').exists()
+
+        response = self.table.scan(**scan_kwargs)
+        items = response.get('Items', [])
+
+        # Sort by timestamp descending (newest first)
+        items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        return items[:limit]
+
+    def merge_sketches(self, service_name, bucket, sketches, log_count):
+        # Read, merge and write back conditioned on the version read (optimistic concurrency)
+        key = {'service_name': service_name, 'bucket': bucket}
+        for attempt in range(SKETCH_MERGE_ATTEMPTS):
+            existing = self.sketch_table.get_item(Key=key, ConsistentRead=True).get('Item')
+            item = dict(key)
+            if existing is None:
+                item.update(sketches)
+                item['log_count'] = log_count
+                item['version'] = 1
+                condition = Attr('service_name').not_exists()
+            else:
+                stored = {name: value.value for name, value in existing.items() if name.startswith(SKETCH_PREFIXES)}
+                item.update(merge_sketch_attributes(stored, sketches))
+                item['log_count'] = existing['log_count'] + log_count
+                item['version'] = existing['version'] + 1
+                condition = Attr('version').eq(existing['version'])
+            try:
+                self.sketch_table.put_item(Item=item, ConditionExpression=condition)
+                return
+            except ClientError as e:
+                if (e.response['Error']['Code'] != 'ConditionalCheckFailedException'
+                        or attempt == SKETCH_MERGE_ATTEMPTS - 1):
+                    raise
+
+    def query_sketches(self, service_name, start_bucket, end_bucket):
+        query_kwargs = {
+            'KeyConditionExpression': Key('service_name').eq(service_name) & Key('bucket').between(start_bucket, end_bucket)
+        }
+        while True:
+            response = self.sketch_table.query(**query_kwargs)
+            for item in response.get('Items', []):
+                yield {
+                    'bucket': item['bucket'],
+                    'log_count': int(item['log_count']),
+                    'sketches': {name: value.value for name, value in item.items() if name.startswith(SKETCH_PREFIXES)}
+                }
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,667 @@
+"""
+Embedded append-only segment store for self-hosted deployments
+
+Layout of the data directory:
+- active.log                    newline-delimited JSON, appended on every write
+- seg-<first>-<last>[-g<n>].dat
+                                sealed segment, records sorted by timestamp
+- seg-<first>-<last>[-g<n>].idx sparse timestamp index, min/max timestamp and
+                                bloom filter for the matching .dat file
+- sketches/<service>/<bucket>.json
+                                analytics sketches for one service and hour
+                                bucket (service name hex encoded)
+
+Writes go to active.log and an in-memory buffer. When the buffer reaches
+segment_max_records it is sorted and sealed into an immutable segment.
+Reads memory-map sealed segments, skip segments by timestamp range and bloom
+filter, and binary search the sparse index to start scanning near `since`.
+Bloom filters also hold each record's log_id, so lookups by ID only scan
+segments that may contain one of the IDs.
+Compaction merges runs of small adjacent segments and drops expired records.
+Every rewrite gets a higher generation (-g<n>), so it never overwrites the
+files it replaces; on open, segments covered by a newer one (left behind
+by a crash before their removal) are deleted.
+
+Coalesced items are written as delta records (occurrence_count 1) to
+active.log and folded together in the in-memory buffer, so a sealed
+segment holds one record per coalesced log_id. A window that spans a seal
+leaves one record in each segment; reads and compaction merge them, and
+upserts add the sealed records' counts (found through the bloom filters)
+so the returned occurrence count covers the whole window.
+
+The directory must be owned by a single process on a POSIX filesystem.
+"""
+
+import base64
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from log_store.base import LogStore, merge_coalesced
+from log_store.sketches import merge_sketch_attributes
+
+ACTIVE_FILE = 'active.log'
+SKETCH_DIR = 'sketches'
+SEGMENT_PATTERN = re.compile(r'^seg-(\d{10})-(\d{10})(?:-g(\d+))?\.idx$')
+
+def _json_default(value):
+    """Serialize Decimal values coming from DynamoDB-shaped items"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_record(item):
+    return json.dumps(item, separators=(',', ':'), default=_json_default).encode('utf-8')
+
+def _timestamp(item):
+    return item.get('timestamp', '')
+
+def _position(item):
+    """Total newest-first order for paging; log_id breaks timestamp ties"""
+    return (_timestamp(item), item.get('log_id', ''))
+
+def index_tokens(item, indexed_attributes=()):
+    """Tokens added to a segment's bloom filter for pruning"""
+    tokens = set()
+    for name in ('log_id', 'service_name') + tuple(indexed_attributes):
+        if name in item:
+            tokens.add(f"{name}={item[name]}")
+    return tokens
+
+class BloomFilter:
+    """Fixed-size bloom filter using double hashing over a blake2b digest"""
+
+    def __init__(self, num_bits, num_hashes, bits=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, token):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, token):
+        for position in self._positions(token):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, token):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(token))
+
+    def to_dict(self):
+        return {
+            'bits': self.num_bits,
+            'hashes': self.num_hashes,
+            'data': base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['bits'], data['hashes'], bytearray(base64.b64decode(data['data'])))
+
+class Segment:
+    """Immutable sealed segment, memory-mapped on first read"""
+
+    def __init__(self, data_path, first_seq, last_seq, meta, generation=0):
+        self.data_path = data_path
+        self.index_path = data_path[:-len('.dat')] + '.idx'
+        self.first_seq = first_seq
+        self.last_seq = last_seq
+        self.generation = generation
+        self.count = meta['count']
+        self.min_ts = meta['min_ts']
+        self.max_ts = meta['max_ts']
+        self.index_ts = [entry[0] for entry in meta['sparse']]
+        self.index_offsets = [entry[1] for entry in meta['sparse']]
+        self.bloom = BloomFilter.from_dict(meta['bloom'])
+        # Segments written before log_id tokens were added cannot rule IDs out
+        self.indexes_log_ids = meta.get('log_ids', False)
+        # Holding the descriptor keeps this version readable after compaction replaces or deletes the file
+        self._file = open(data_path, 'rb')
+        self._mmap = None
+        self._open_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory, first_seq, last_seq, generation=0):
+        data_path = os.path.join(directory, segment_name(first_seq, last_seq, generation) + '.dat')
+        with open(data_path[:-len('.dat')] + '.idx', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(data_path, first_seq, last_seq, meta, generation)
+
+    def covers(self, other):
+        """Whether this segment is a later rewrite of other's records"""
+        # Rewrites always have a higher generation than every segment they replace
+        return (self.first_seq <= other.first_seq and other.last_seq <= self.last_seq
+                and self.generation > other.generation)
+
+    def might_contain(self, token):
+        return token in self.bloom
+
+    def might_contain_log_id(self, log_id):
+        return not self.indexes_log_ids or f"log_id={log_id}" in self.bloom
+
+    def _view(self):
+        with self._open_lock:
+            if self._mmap is None:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+    def start_offset(self, since):
+        """Offset of the last sparse index entry strictly before `since`"""
+        if not since:
+            return 0
+        position = bisect.bisect_left(self.index_ts, since) - 1
+        return self.index_offsets[position] if position >= 0 else 0
+
+    def scan(self, since=None):
+        """Yield records with timestamp >= since in timestamp order"""
+        view = self._view()
+        offset = self.start_offset(since)
+        size = len(view)
+        while offset < size:
+            end = view.find(b'\n', offset)
+            if end == -1:
+                end = size
+            item = json.loads(view[offset:end])
+            offset = end + 1
+            if since and _timestamp(item) < since:
+                continue
+            yield item
+
+    def close(self):
+        with self._open_lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
+
+def segment_name(first_seq, last_seq, generation=0):
+    name = f"seg-{first_seq:010d}-{last_seq:010d}"
+    return f"{name}-g{generation}" if generation else name
+
+def write_segment(directory, first_seq, last_seq, records, index_interval, indexed_attributes=(), generation=0):
+    """
+    Write timestamp-sorted records to a new segment and return it
+
+    The .dat file is renamed into place before the .idx file, so a segment
+    only becomes visible once both are complete. The name must not belong
+    to a live segment; rewrites use a higher generation.
+    """
+    name = segment_name(first_seq, last_seq, generation)
+    data_path = os.path.join(directory, name + '.dat')
+    index_path = os.path.join(directory, name + '.idx')
+
+    sparse = []
+    tokens = set()
+    count = 0
+    min_ts = max_ts = None
+    offset = 0
+    with open(data_path + '.tmp', 'wb') as f:
+        for item in records:
+            ts = _timestamp(item)
+            if count % index_interval == 0:
+                sparse.append([ts, offset])
+            if min_ts is None:
+                min_ts = ts
+            max_ts = ts
+            tokens.update(index_tokens(item, indexed_attributes))
+            line = encode_record(item) + b'\n'
+            f.write(line)
+            offset += len(line)
+            count += 1
+        f.flush()
+        os.fsync(f.fileno())
+
+    if count == 0:
+        os.remove(data_path + '.tmp')
+        return None
+
+    bloom = BloomFilter.for_capacity(len(tokens))
+    for token in tokens:
+        bloom.add(token)
+
+    meta = {
+        'count': count,
+        'min_ts': min_ts,
+        'max_ts': max_ts,
+        'sparse': sparse,
+        'bloom': bloom.to_dict(),
+        'log_ids': True
+    }
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(data_path + '.tmp', data_path)
+    os.replace(index_path + '.tmp', index_path)
+    return Segment(data_path, first_seq, last_seq, meta, generation)
+
+class SegmentLogStore(LogStore):
+    """LogStore persisting to local append-only segment files"""
+
+    def __init__(self, path, segment_max_records=10000, index_interval=64, indexed_attributes=(),
+                 retention=None, compaction_min_segments=4, compacted_max_records=None, fsync=False):
+        self.path = path
+        self.segment_max_records = segment_max_records
+        self.index_interval = index_interval
+        self.indexed_attributes = tuple(indexed_attributes)
+        self.retention = retention
+        self.compaction_min_segments = compaction_min_segments
+        self.compacted_max_records = compacted_max_records or segment_max_records * 10
+        self.fsync = fsync
+
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._stop = None
+        self._maintenance = None
+
+        os.makedirs(path, exist_ok=True)
+        self._segments = self._load_segments()
+        self._next_seq = max((s.last_seq for s in self._segments), default=0) + 1
+        self._active = []
+        self._active_index = {}  # coalesced log_id -> position in self._active
+        self._sealed_counts = {}  # coalesced log_id -> occurrences already in sealed segments
+        for record in self._replay_active():
+            self._add_active_locked(record)
+        self._active_file = open(os.path.join(path, ACTIVE_FILE), 'ab')
+
+    def _load_segments(self):
+        names = set(os.listdir(self.path))
+        segments = []
+        for name in names:
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.path, name))
+            elif name.startswith('seg-') and name.endswith('.dat') and name[:-len('.dat')] + '.idx' not in names:
+                # A rewrite that crashed before its .idx was renamed never became visible
+                os.remove(os.path.join(self.path, name))
+            else:
+                match = SEGMENT_PATTERN.match(name)
+                if match and name[:-len('.idx')] + '.dat' in names:
+                    segments.append(Segment.load(self.path, int(match.group(1)), int(match.group(2)),
+                                                 int(match.group(3) or 0)))
+
+        # A crash during compaction can leave replaced segments next to their rewrite
+        live = [s for s in segments if not any(other.covers(s) for other in segments)]
+        for segment in segments:
+            if segment not in live:
+                segment.close()
+                os.remove(segment.index_path)
+                os.remove(segment.data_path)
+        live.sort(key=lambda s: s.first_seq)
+        return live
+
+    def _replay_active(self):
+        """Reload unsealed records, truncating a partially written last line"""
+        active_path = os.path.join(self.path, ACTIVE_FILE)
+        if not os.path.exists(active_path):
+            return []
+        items = []
+        good_bytes = 0
+        with open(active_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    break
+                good_bytes += len(line)
+        if good_bytes != os.path.getsize(active_path):
+            with open(active_path, 'r+b') as f:
+                f.truncate(good_bytes)
+        return items
+
+    def _add_active_locked(self, record):
+        """Add a record to the buffer, folding coalesced deltas into their item"""
+        if 'occurrence_count' in record:
+            position = self._active_index.get(record['log_id'])
+            if position is not None:
+                self._active[position] = merge_coalesced(self._active[position], record)
+                return self._active[position]
+            self._active_index[record['log_id']] = len(self._active)
+        self._active.append(record)
+        return record
+
+    def _append_locked(self, items):
+        lines = [encode_record(item) for item in items]
+        self._active_file.write(b''.join(line + b'\n' for line in lines))
+        self._active_file.flush()
+        if self.fsync:
+            os.fsync(self._active_file.fileno())
+        # Keep the buffer in the same shape a sealed segment would return
+        stored = [self._add_active_locked(json.loads(line)) for line in lines]
+        if len(self._active) >= self.segment_max_records:
+            self._seal_locked()
+        return stored
+
+    def _seal_locked(self):
+        records = sorted(self._active, key=_timestamp)
+        segment = write_segment(self.path, self._next_seq, self._next_seq, records,
+                                self.index_interval, self.indexed_attributes)
+        self._next_seq += 1
+        if segment is not None:
+            self._segments.append(segment)
+        self._active = []
+        self._active_index = {}
+        self._sealed_counts = {}
+        self._active_file.seek(0)
+        self._active_file.truncate(0)
+        self._active_file.flush()
+
+    def put(self, item):
+        with self._lock:
+            self._append_locked([item])
+
+    def put_batch(self, items):
+        items = list(items)
+        if not items:
+            return
+        with self._lock:
+            self._append_locked(items)
+
+    def upsert_coalesced(self, item, seen_at, weight=None):
+        record = dict(item)
+        record['occurrence_count'] = 1
+        record['last_seen'] = seen_at
+        if weight is not None:
+            record['weighted_count'] = weight
+        log_id = record['log_id']
+        with self._lock:
+            sealed = self._sealed_counts.get(log_id)
+            if sealed is None:
+                sealed = self._sealed_counts[log_id] = self._sealed_count_locked(log_id)
+            stored = self._append_locked([record])[0]
+        return sealed + int(stored['occurrence_count'])
+
+    def _sealed_count_locked(self, log_id):
+        """Occurrences of a coalesced item in sealed segments (once per log_id per seal)"""
+        count = 0
+        for segment in self._segments:
+            if segment.might_contain_log_id(log_id):
+                count += sum(int(item.get('occurrence_count', 1)) for item in segment.scan()
+                             if item.get('log_id') == log_id)
+        return count
+
+    def flush(self):
+        """Seal the in-memory buffer into a segment"""
+        with self._lock:
+            if self._active:
+                self._seal_locked()
+
+    def query_recent(self, since, limit, service_name=None, log_type=None, level=None,
+                     coalesced_only=False):
+        since = since or ''
+        filters = [(k, v) for k, v in (('service_name', service_name),
+                                       ('log_type', log_type),
+                                       ('level', level)) if v is not None]
+        token = f"service_name={service_name}" if service_name is not None else None
+
+        def matches(item):
+            if coalesced_only and 'occurrence_count' not in item:
+                return False
+            return all(item.get(k) == v for k, v in filters)
+
+        return self._query(since, limit, matches, token)
+
+    def query_by_attribute(self, name, value, limit, start_key=None):
+        after = (start_key['timestamp'], start_key['log_id']) if start_key else None
+
+        def matches(item):
+            return item.get(name) == value and (after is None or _position(item) < after)
+
+        # Bloom filters only cover configured attributes; others fall back to a full scan
+        token = f"{name}={value}" if name in self.indexed_attributes else None
+        items = self._query('', limit + 1, matches, token, order=_position)
+        if len(items) <= limit:
+            return items, None
+        last = items[limit - 1]
+        return items[:limit], {'timestamp': _timestamp(last), 'log_id': last['log_id']}
+
+    def get_batch(self, log_ids):
+        wanted = set(log_ids)
+        with self._lock:
+            active = list(self._active)
+            segments = list(self._segments)
+
+        found = {}
+
+        def collect(items):
+            for item in items:
+                log_id = item.get('log_id')
+                if log_id not in wanted:
+                    continue
+                existing = found.get(log_id)
+                # A coalesced item split across seals has one record per segment
+                found[log_id] = merge_coalesced(existing, item) if existing else item
+
+        collect(active)
+        for segment in segments:
+            if any(segment.might_contain_log_id(log_id) for log_id in wanted):
+                collect(segment.scan())
+        return found
+
+    def _query(self, since, limit, matches, token, order=_timestamp):
+        """Newest-first scan of the buffer and segments, pruned by time range and bloom token"""
+        with self._lock:
+            active = list(self._active)
+            segments = list(self._segments)
+
+        plain = []
+        coalesced = {}  # coalesced records can be split across segments
+
+        def collect(items):
+            fresh = []
+            for item in items:
+                if 'occurrence_count' in item:
+                    existing = coalesced.get(item['log_id'])
+                    coalesced[item['log_id']] = merge_coalesced(existing, item) if existing else item
+                else:
+                    fresh.append(item)
+            return heapq.nlargest(limit, itertools.chain(plain, fresh), key=order)
+
+        def results():
+            return heapq.nlargest(limit, itertools.chain(plain, coalesced.values()), key=order)
+
+        def may_extend(current, remaining):
+            # An older part of a returned coalesced item changes its count and first-seen timestamp
+            pending = [item['log_id'] for item in current if 'occurrence_count' in item]
+            return any(segment.might_contain_log_id(log_id) for segment in remaining for log_id in pending)
+
+        plain = collect(item for item in active if _timestamp(item) >= since and matches(item))
+
+        # Newest segments first, so the scan can stop once older segments cannot contribute
+        ordered = sorted(segments, key=lambda s: s.max_ts, reverse=True)
+        for position, segment in enumerate(ordered):
+            if segment.max_ts < since:
+                break
+            current = results()
+            if (len(current) >= limit and segment.max_ts < _timestamp(current[-1])
+                    and not may_extend(current, ordered[position:])):
+                break
+            if token is not None and not segment.might_contain(token):
+                continue
+            plain = collect(item for item in segment.scan(since) if matches(item))
+
+        return results()
+
+    def _expired(self, item, cutoff, now):
+        if cutoff is not None and _timestamp(item) < cutoff:
+            return True
+        ttl = item.get('ttl')
+        return isinstance(ttl, (int, float)) and ttl < now
+
+    def compact(self):
+        """
+        Drop expired segments and merge runs of small adjacent segments
+
+        Safe to call while reads and writes continue; only the swap of the
+        segment list happens under the store lock.
+        """
+        with self._compaction_lock:
+            now = time.time()
+            cutoff = None
+            if self.retention is not None:
+                cutoff = (datetime.utcnow() - self.retention).isoformat()
+
+            with self._lock:
+                segments = list(self._segments)
+
+            expired = [s for s in segments if cutoff is not None and s.max_ts < cutoff]
+            survivors = [s for s in segments if s not in expired]
+
+            groups = []
+            run = []
+            run_count = 0
+            for segment in survivors:
+                if segment.count >= self.compacted_max_records or run_count + segment.count > self.compacted_max_records:
+                    if len(run) >= self.compaction_min_segments:
+                        groups.append(run)
+                    run, run_count = [], 0
+                if segment.count < self.compacted_max_records:
+                    run.append(segment)
+                    run_count += segment.count
+            if len(run) >= self.compaction_min_segments:
+                groups.append(run)
+
+            # Segments partly past retention are rewritten on their own
+            grouped = {id(s) for group in groups for s in group}
+            for segment in survivors:
+                if id(segment) not in grouped and cutoff is not None and segment.min_ts < cutoff:
+                    groups.append([segment])
+
+            replacements = []
+            for group in groups:
+                coalesced = {}
+                for segment in group:
+                    for item in segment.scan():
+                        if 'occurrence_count' in item:
+                            existing = coalesced.get(item['log_id'])
+                            coalesced[item['log_id']] = merge_coalesced(existing, item) if existing else item
+                plain = heapq.merge(*(s.scan() for s in group), key=_timestamp)
+                merged = heapq.merge(
+                    (item for item in plain if 'occurrence_count' not in item),
+                    sorted(coalesced.values(), key=_timestamp),
+                    key=_timestamp
+                )
+                records = (item for item in merged if not self._expired(item, cutoff, now))
+                # A new generation keeps the replaced files intact until the swap
+                generation = max(s.generation for s in group) + 1
+                new_segment = write_segment(self.path, group[0].first_seq, group[-1].last_seq,
+                                            records, self.index_interval, self.indexed_attributes,
+                                            generation)
+                replacements.append((group, new_segment))
+
+            with self._lock:
+                removed = {id(s) for s in expired}
+                for group, _ in replacements:
+                    removed.update(id(s) for s in group)
+                remaining = [s for s in self._segments if id(s) not in removed]
+                remaining.extend(new for _, new in replacements if new is not None)
+                remaining.sort(key=lambda s: s.first_seq)
+                self._segments = remaining
+
+            # Replaced segments are not closed here: in-flight reads may still hold them
+            kept_paths = {s.data_path for s in remaining}
+            for segment in expired + [s for group, _ in replacements for s in group]:
+                if segment.data_path not in kept_paths:
+                    for file_path in (segment.index_path, segment.data_path):
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
+
+            return {
+                'expired_segments': len(expired),
+                'merged_groups': len(replacements),
+                'segments': len(remaining)
+            }
+
+    def _sketch_dir(self, service_name):
+        # Hex keeps arbitrary service names inside the data directory
+        return os.path.join(self.path, SKETCH_DIR, 'svc-' + service_name.encode('utf-8').hex())
+
+    def merge_sketches(self, service_name, bucket, sketches, log_count):
+        directory = self._sketch_dir(service_name)
+        path = os.path.join(directory, f'{bucket}.json')
+        with self._lock:
+            stored = {'log_count': 0, 'sketches': {}}
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    stored = json.load(f)
+            existing = {name: base64.b64decode(data) for name, data in stored['sketches'].items()}
+            merged = merge_sketch_attributes(existing, sketches)
+            record = {
+                'log_count': stored['log_count'] + log_count,
+                'sketches': {name: base64.b64encode(data).decode('ascii') for name, data in merged.items()}
+            }
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(record, f)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+    def query_sketches(self, service_name, start_bucket, end_bucket):
+        directory = self._sketch_dir(service_name)
+        if not os.path.isdir(directory):
+            return
+        buckets = sorted(name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json'))
+        for bucket in buckets:
+            if not start_bucket <= bucket <= end_bucket:
+                continue
+            try:
+                with open(os.path.join(directory, f'{bucket}.json'), 'rb') as f:
+                    stored = json.load(f)
+            except FileNotFoundError:
+                continue
+            yield {
+                'bucket': bucket,
+                'log_count': stored['log_count'],
+                'sketches': {name: base64.b64decode(data) for name, data in stored['sketches'].items()}
+            }
+
+    def start_maintenance(self, interval_seconds):
+        """Run compaction and expiry on a daemon thread every interval_seconds"""
+        if self._maintenance is not None:
+            return
+        self._stop = threading.Event()
+
+        def run():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f"ERROR: Segment compaction failed: {e}")
+
+        self._maintenance = threading.Thread(target=run, name="segment-compaction", daemon=True)
+        self._maintenance.start()
+
+    def close(self):
+        if self._maintenance is not None:
+            self._stop.set()
+            self._maintenance.join()
+            self._maintenance = None
+        with self._lock:
+            self._active_file.close()
+            for segment in self._segments:
+                segment.close()
@@ -0,0 +1,353 @@
+
+import os
+import sys
+import pytest
+from datetime import datetime, timedelta
+
+# Add the layer's python directory to the path to allow imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+import log_store
+from log_store import dynamodb as dynamodb_backend
+from log_store.segment import BloomFilter, SegmentLogStore
+from log_store.sketches import HyperLogLog, load_sketch
+
+BASE_TIME = datetime.utcnow() - timedelta(hours=1)
+
+def make_item(i, service='svc-a', level='INFO', minutes=0):
+    """Build a log item i seconds after BASE_TIME"""
+    return {
+        'log_id': f'log-{i}',
+        'timestamp': (BASE_TIME + timedelta(seconds=i, minutes=minutes)).isoformat(),
+        'service_name': service,
+        'log_type': 'application',
+        'level': level,
+        'message': f'message {i}'
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    """Segment store with small segments so tests exercise sealing"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=10, index_interval=4)
+    yield s
+    s.close()
+
+def test_bloom_filter_membership():
+    """Test bloom filter has no false negatives and survives serialization"""
+    bloom = BloomFilter.for_capacity(100)
+    for i in range(100):
+        bloom.add(f'token-{i}')
+    restored = BloomFilter.from_dict(bloom.to_dict())
+    assert all(f'token-{i}' in restored for i in range(100))
+    false_positives = sum(f'other-{i}' in restored for i in range(1000))
+    assert false_positives < 50
+
+def test_segment_store_query_recent_across_segments(store):
+    """Test newest-first reads span sealed segments and the active buffer"""
+    items = [make_item(i) for i in range(25)]
+    # Insert out of order; segments sort on seal
+    for item in items[::-1]:
+        store.put(item)
+    assert len(store._segments) == 2
+
+    results = store.query_recent('', 5)
+    assert [r['log_id'] for r in results] == ['log-24', 'log-23', 'log-22', 'log-21', 'log-20']
+
+    since = make_item(18)['timestamp']
+    results = store.query_recent(since, 100)
+    assert sorted(r['log_id'] for r in results) == sorted(f'log-{i}' for i in range(18, 25))
+
+def test_segment_store_filters_and_bloom_pruning(store):
+    """Test filters and that segments without the service are skipped"""
+    store.put_batch([make_item(i, service='svc-a') for i in range(10)])
+    store.put_batch([make_item(i, service='svc-b', level='ERROR') for i in range(10, 20)])
+
+    assert len(store._segments) == 2
+    assert not store._segments[0].might_contain('service_name=svc-b')
+
+    results = store.query_recent('', 100, service_name='svc-b')
+    assert len(results) == 10
+    assert all(r['service_name'] == 'svc-b' for r in results)
+
+    results = store.query_recent('', 100, level='ERROR', service_name='svc-a')
+    assert results == []
+
+def test_segment_store_query_by_attribute(tmp_path):
+    """Test lookups by a promoted attribute use the bloom filter to skip segments"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=10, indexed_attributes=('trace_id',))
+    try:
+        s.put_batch([dict(make_item(i), trace_id=f'trace-{i % 2}') for i in range(10)])
+        s.put_batch([make_item(i) for i in range(10, 20)])
+        s.put(dict(make_item(20), trace_id='trace-1'))
+
+        assert s._segments[0].might_contain('trace_id=trace-1')
+        assert not s._segments[1].might_contain('trace_id=trace-1')
+
+        results, next_key = s.query_by_attribute('trace_id', 'trace-1', 100)
+        assert [r['log_id'] for r in results] == ['log-20', 'log-9', 'log-7', 'log-5', 'log-3', 'log-1']
+        assert next_key is None
+        assert s.query_by_attribute('trace_id', 'missing', 100) == ([], None)
+
+        # Pages continue after the previous page's last item
+        pages = []
+        next_key = None
+        while True:
+            results, next_key = s.query_by_attribute('trace_id', 'trace-1', 4, start_key=next_key)
+            pages.append([r['log_id'] for r in results])
+            if next_key is None:
+                break
+        assert pages == [['log-20', 'log-9', 'log-7', 'log-5'], ['log-3', 'log-1']]
+    finally:
+        s.close()
+
+def test_segment_store_persists_across_reopen(tmp_path):
+    """Test sealed segments and unsealed writes are reloaded"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=10)
+    s.put_batch([make_item(i) for i in range(15)])
+    s.close()
+
+    # Simulate a crash in the middle of an append
+    with open(os.path.join(str(tmp_path), 'active.log'), 'ab') as f:
+        f.write(b'{"log_id": "partial"')
+
+    reopened = SegmentLogStore(str(tmp_path), segment_max_records=10)
+    try:
+        results = reopened.query_recent('', 100)
+        assert len(results) == 15
+        assert 'partial' not in {r['log_id'] for r in results}
+    finally:
+        reopened.close()
+
+def test_segment_store_compaction_merges_and_expires(tmp_path):
+    """Test compaction merges small segments and drops expired records"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=10, compaction_min_segments=2,
+                        retention=timedelta(minutes=90))
+    try:
+        # 10 records older than retention, 30 recent ones
+        s.put_batch([make_item(i, minutes=-60) for i in range(10)])
+        for start in range(10, 40, 10):
+            s.put_batch([make_item(i) for i in range(start, start + 10)])
+        assert len(s._segments) == 4
+
+        stats = s.compact()
+        assert stats['expired_segments'] == 1
+        assert stats['segments'] == 1
+
+        results = s.query_recent('', 100)
+        assert len(results) == 30
+        assert results[0]['log_id'] == 'log-39'
+        data_files = [n for n in os.listdir(str(tmp_path)) if n.endswith('.dat')]
+        assert len(data_files) == 1
+    finally:
+        s.close()
+
+def test_segment_store_rewrites_use_new_generation(tmp_path):
+    """Test a partly expired segment is rewritten under a new name and crash leftovers are cleaned on open"""
+    path = str(tmp_path)
+    s = SegmentLogStore(path, segment_max_records=10, retention=timedelta(minutes=90))
+    s.put_batch([make_item(i, minutes=-60) for i in range(5)] + [make_item(i) for i in range(5, 10)])
+    original = sorted(os.listdir(path))
+    assert 'seg-0000000001-0000000001.dat' in original
+    saved = {}
+    for name in ('seg-0000000001-0000000001.dat', 'seg-0000000001-0000000001.idx'):
+        with open(os.path.join(path, name), 'rb') as f:
+            saved[name] = f.read()
+
+    s.compact()
+    segment_files = sorted(n for n in os.listdir(path) if n.startswith('seg-'))
+    assert segment_files == ['seg-0000000001-0000000001-g1.dat', 'seg-0000000001-0000000001-g1.idx']
+    assert len(s.query_recent('', 100)) == 5
+    s.close()
+
+    # Crash before the replaced pair was removed, and a later rewrite that never got its .idx
+    for name, data in saved.items():
+        with open(os.path.join(path, name), 'wb') as f:
+            f.write(data)
+    with open(os.path.join(path, 'seg-0000000001-0000000001-g2.dat'), 'wb') as f:
+        f.write(b'{"log_id": "partial"}\n')
+
+    reopened = SegmentLogStore(path, segment_max_records=10)
+    try:
+        assert sorted(n for n in os.listdir(path) if n.startswith('seg-')) == segment_files
+        results = reopened.query_recent('', 100)
+        assert sorted(r['log_id'] for r in results) == [f'log-{i}' for i in range(5, 10)]
+    finally:
+        reopened.close()
+
+def test_segment_store_coalesced_counts_across_seals(tmp_path):
+    """Test coalesced deltas fold together in the buffer, across segments and on compaction"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=3, compaction_min_segments=2)
+    try:
+        coalesced = dict(make_item(0, level='ERROR'), log_id='log-repeat', first_seen=make_item(0)['timestamp'])
+        assert s.upsert_coalesced(coalesced, coalesced['timestamp']) == 1
+        assert s.upsert_coalesced(coalesced, make_item(1)['timestamp']) == 2
+        s.put_batch([make_item(i) for i in range(2, 4)])
+        assert len(s._segments) == 1
+
+        # The window continues after the seal
+        assert s.upsert_coalesced(coalesced, make_item(5)['timestamp']) == 3
+        results = s.query_recent('', 10, coalesced_only=True)
+        assert len(results) == 1
+        assert results[0]['occurrence_count'] == 3
+        assert results[0]['last_seen'] == make_item(5)['timestamp']
+
+        s.put_batch([make_item(i) for i in range(6, 8)])
+        s.compact()
+        assert len(s._segments) == 1
+        results = s.query_recent('', 10)
+        assert len(results) == 5
+        assert [r['occurrence_count'] for r in results if r['log_id'] == 'log-repeat'] == [3]
+    finally:
+        s.close()
+
+def test_segment_store_upsert_counts_span_seals(tmp_path):
+    """Test upserts return the whole window's count after a seal and after reopening"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=10)
+    repeat = dict(make_item(0, level='ERROR'), log_id='log-repeat')
+    assert [s.upsert_coalesced(repeat, repeat['timestamp']) for _ in range(3)] == [1, 2, 3]
+    s.flush()
+    assert s.upsert_coalesced(repeat, repeat['timestamp']) == 4
+    assert s.get_batch(['log-repeat'])['log-repeat']['occurrence_count'] == 4
+    s.close()
+
+    reopened = SegmentLogStore(str(tmp_path), segment_max_records=10)
+    try:
+        assert reopened.upsert_coalesced(repeat, repeat['timestamp']) == 5
+        # Other coalesced items do not pick up this item's count
+        assert reopened.upsert_coalesced(dict(repeat, log_id='log-other'), repeat['timestamp']) == 1
+    finally:
+        reopened.close()
+
+def test_segment_store_coalesced_counts_do_not_depend_on_limit(tmp_path):
+    """Test the newest-first scan does not stop before the older part of a split coalesced item"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=10)
+    try:
+        repeat = dict(make_item(0, level='ERROR'), log_id='log-repeat')
+        s.upsert_coalesced(repeat, repeat['timestamp'])
+        s.flush()
+        for i in (5, 6):
+            s.upsert_coalesced(dict(repeat, timestamp=make_item(i)['timestamp']), make_item(i)['timestamp'])
+        s.flush()
+        assert len(s._segments) == 2
+
+        for limit in (1, 2, 10):
+            results = s.query_recent('', limit, coalesced_only=True)
+            assert len(results) == 1
+            assert results[0]['occurrence_count'] == 3
+            assert results[0]['timestamp'] == make_item(0)['timestamp']
+            assert results[0]['last_seen'] == make_item(6)['timestamp']
+    finally:
+        s.close()
+
+def test_segment_store_get_batch(tmp_path):
+    """Test lookups by log_id merge split coalesced records and skip segments by bloom filter"""
+    s = SegmentLogStore(str(tmp_path), segment_max_records=10)
+    try:
+        s.put_batch([make_item(i) for i in range(10)])
+        s.put_batch([make_item(i) for i in range(10, 20)])
+        repeat = dict(make_item(20), log_id='log-repeat')
+        s.upsert_coalesced(repeat, repeat['timestamp'])
+        s.flush()
+        s.upsert_coalesced(repeat, repeat['timestamp'])
+
+        assert s._segments[0].might_contain_log_id('log-3')
+        assert not s._segments[1].might_contain_log_id('log-3')
+
+        found = s.get_batch(['log-3', 'log-15', 'log-repeat', 'log-missing'])
+        assert sorted(found) == ['log-15', 'log-3', 'log-repeat']
+        assert found['log-15']['message'] == 'message 15'
+        assert found['log-repeat']['occurrence_count'] == 2
+    finally:
+        s.close()
+
+def test_dynamodb_store_get_batch_retries_unprocessed_keys(monkeypatch):
+    """Test BatchGetItem is chunked by 100 keys and UnprocessedKeys are retried"""
+    calls = []
+
+    class FakeClient:
+        def batch_get_item(self, RequestItems):
+            keys = [key['log_id'] for key in RequestItems['logs']['Keys']]
+            calls.append(keys)
+            # Leave the last key of each first request unprocessed
+            served, unprocessed = (keys[:-1], keys[-1:]) if len(keys) > 1 else (keys, [])
+            response = {'Responses': {'logs': [{'log_id': k, 'level': 'INFO'} for k in served]}}
+            if unprocessed:
+                response['UnprocessedKeys'] = {'logs': {'Keys': [{'log_id': k} for k in unprocessed]}}
+            return response
+
+    class FakeTable:
+        class meta:
+            client = FakeClient()
+
+    monkeypatch.setattr(dynamodb_backend, 'BATCH_GET_BACKOFF_SECONDS', 0)
+    store = dynamodb_backend.DynamoDBLogStore('logs')
+    store._table = FakeTable()
+
+    log_ids = [f'log-{i}' for i in range(250)]
+    found = store.get_batch(log_ids + log_ids[:10])
+
+    assert sorted(found) == sorted(log_ids)
+    assert found['log-0'] == {'log_id': 'log-0', 'level': 'INFO'}
+    assert sorted(len(keys) for keys in calls) == [1, 1, 1, 50, 100, 100]
+
+def test_segment_store_merges_sketches(tmp_path):
+    """Test sketch buckets merge on write and are returned oldest first within the range"""
+    def sketch_of(*values):
+        sketch = HyperLogLog()
+        for value in values:
+            sketch.add(value)
+        return {'distinct:request_id': sketch.to_bytes()}
+
+    s = SegmentLogStore(str(tmp_path))
+    try:
+        s.merge_sketches('svc/../a', '2026-02-02T10', sketch_of('r1', 'r2'), 2)
+        s.merge_sketches('svc/../a', '2026-02-02T10', sketch_of('r2', 'r3'), 2)
+        s.merge_sketches('svc/../a', '2026-02-02T12', sketch_of('r4'), 1)
+        s.merge_sketches('svc/../a', '2026-02-02T13', sketch_of('r5'), 1)
+        s.merge_sketches('svc-b', '2026-02-02T10', sketch_of('r9'), 1)
+    finally:
+        s.close()
+
+    s = SegmentLogStore(str(tmp_path))
+    try:
+        buckets = list(s.query_sketches('svc/../a', '2026-02-02T09', '2026-02-02T12'))
+        assert [b['bucket'] for b in buckets] == ['2026-02-02T10', '2026-02-02T12']
+        assert buckets[0]['log_count'] == 4
+        assert load_sketch(buckets[0]['sketches']['distinct:request_id']).estimate() == 3
+        assert list(s.query_sketches('missing', '2026-02-02T00', '2026-02-02T23')) == []
+    finally:
+        s.close()
+
+def test_get_log_store_selects_backend(tmp_path, monkeypatch):
+    """Test the factory honours LOG_STORE_BACKEND and caches stores"""
+    monkeypatch.setenv('LOG_STORE_BACKEND', 'segment')
+    monkeypatch.setenv('LOG_STORE_PATH', str(tmp_path))
+    monkeypatch.setenv('LOG_STORE_COMPACTION_SECONDS', '0')
+    try:
+        store = log_store.get_log_store()
+        assert isinstance(store, SegmentLogStore)
+        assert log_store.get_log_store() is store
+        assert store.fsync is False
+    finally:
+        log_store.reset_stores()
+
+    monkeypatch.setenv('LOG_STORE_FSYNC', 'true')
+    try:
+        assert log_store.get_log_store().fsync is True
+    finally:
+        log_store.reset_stores()
+
+    monkeypatch.setenv('LOG_STORE_BACKEND', 'dynamodb')
+    with pytest.raises(ValueError):
+        log_store.get_log_store(None)
+
+    monkeypatch.setenv('INDEXED_METADATA_KEYS', 'trace_id, request_id')
+    assert log_store.get_indexed_attributes() == ('trace_id', 'request_id')
+    assert log_store.index_name('trace_id') == 'trace-id-index'
+    monkeypatch.setenv('INDEXED_METADATA_KEYS', 'trace_id,timestamp')
+    with pytest.raises(ValueError):
+        log_store.get_indexed_attributes()
+
+    monkeypatch.setenv('LOG_STORE_BACKEND', 'unknown')
+    with pytest.raises(ValueError):
+        log_store.get_backend_name()
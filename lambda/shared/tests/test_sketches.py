@@ -0,0 +1,79 @@
+
+import os
+import random
+import sys
+import pytest
+from datetime import datetime
+
+# Add the layer's python directory to the path to allow imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from log_store.sketches import (HyperLogLog, TDigest, bucket_for, load_sketch,
+                                merge_sketch_attributes, parse_timestamp)
+
+def test_hyperloglog_estimate_and_merge():
+    """Test distinct estimates stay within a few percent and merge as a union"""
+    first = HyperLogLog()
+    second = HyperLogLog()
+    for i in range(20000):
+        first.add(f'request-{i}')
+        first.add(f'request-{i}')  # duplicates do not count
+    for i in range(10000, 30000):
+        second.add(f'request-{i}')
+
+    assert first.estimate() == pytest.approx(20000, rel=0.05)
+    merged = load_sketch(first.to_bytes()).merge(load_sketch(second.to_bytes()))
+    assert merged.estimate() == pytest.approx(30000, rel=0.05)
+
+def test_hyperloglog_small_cardinality_is_compact():
+    """Test small sets are near exact and serialize to a few hundred bytes"""
+    sketch = HyperLogLog()
+    for i in range(50):
+        sketch.add(i)
+    assert sketch.estimate() == 50
+    assert len(sketch.to_bytes()) < 512
+
+def test_tdigest_quantiles_and_merge():
+    """Test percentiles of merged digests track the exact values"""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+    digests = []
+    for start in range(0, len(values), 5000):
+        digest = TDigest()
+        for value in values[start:start + 5000]:
+            digest.add(value)
+        digests.append(digest)
+
+    merged = load_sketch(digests[0].to_bytes())
+    for digest in digests[1:]:
+        merged.merge(load_sketch(digest.to_bytes()))
+
+    exact = sorted(values)
+    assert merged.count == len(values)
+    assert merged.quantile(0) == exact[0]
+    assert merged.quantile(1) == exact[-1]
+    for q in (0.5, 0.9, 0.99):
+        assert merged.quantile(q) == pytest.approx(exact[int(q * len(exact))], rel=0.05)
+    assert len(merged.to_bytes()) < 4096
+
+def test_merge_sketch_attributes():
+    """Test attribute dicts merge sketches present in both and keep the rest"""
+    a, b = HyperLogLog(), HyperLogLog()
+    a.add('x')
+    b.add('y')
+    digest = TDigest()
+    digest.add(5)
+
+    merged = merge_sketch_attributes({'distinct:user_id': a.to_bytes()},
+                                     {'distinct:user_id': b.to_bytes(), 'percentiles:duration_ms': digest.to_bytes()})
+
+    assert load_sketch(merged['distinct:user_id']).estimate() == 2
+    assert load_sketch(merged['percentiles:duration_ms']).quantile(0.5) == 5
+
+def test_bucket_for_normalizes_to_utc_hour():
+    """Test timestamps with offsets land in their UTC hour bucket"""
+    assert bucket_for(parse_timestamp('2026-02-02T10:30:45.123Z')) == '2026-02-02T10'
+    assert bucket_for(parse_timestamp('2026-02-02T01:30:00+02:00')) == '2026-02-01T23'
+    assert bucket_for(datetime(2026, 2, 2, 9, 59)) == '2026-02-02T09'
+    with pytest.raises(ValueError):
+        parse_timestamp('not a timestamp')
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Fingerprinting Benchmark for Simple Log Service
+Measures message templating + fingerprinting cost per log line and compares
+it with the ingest rates in docs/ARCHITECTURE.md (1,000 logs/s sustained,
+5,000 requests/s burst). Runs locally; no AWS access needed.
+
+Usage:
+    python scripts/benchmark_fingerprint.py --messages 200000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'ingest'))
+
+from fingerprint import coalesce_log_id, fingerprint, message_template
+
+# Ingest rates from docs/ARCHITECTURE.md
+SUSTAINED_RATE = 1000
+BURST_RATE = 5000
+
+MESSAGE_SHAPES = [
+    lambda r: f"Worker {r.randint(1, 64)} crashed: connection to 10.0.{r.randint(0, 255)}.{r.randint(0, 255)}:5432 refused",
+    lambda r: f"Request {uuid.UUID(int=r.getrandbits(128))} completed in {r.randint(1, 5000)} ms with status {r.choice([200, 201, 404, 500])}",
+    lambda r: f"Segfault at 0x{r.getrandbits(48):012x} in libworker.so (pid {r.randint(1000, 65000)})",
+    lambda r: f"Cache miss for key user:{r.randint(1, 10**7)}:profile, refilled {r.randint(1, 512)} bytes",
+    lambda r: "Health check passed",
+    lambda r: f"Retrying upload of object {r.getrandbits(64):016x} (attempt {r.randint(1, 5)} of 5) after {r.random() * 10:.2f}s backoff",
+]
+
+def generate_messages(count, seed=42):
+    rng = random.Random(seed)
+    return [rng.choice(MESSAGE_SHAPES)(rng) for _ in range(count)]
+
+def run_once(messages):
+    """Template, fingerprint and derive the coalesced log_id for every message"""
+    start = time.perf_counter()
+    for message in messages:
+        template = message_template(message)
+        coalesce_log_id('benchmark-service', 'ERROR', fingerprint(template), 0)
+    return time.perf_counter() - start
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark message fingerprinting")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Simple Log Service - Fingerprinting Benchmark")
+    print("=" * 60)
+    print(f"Messages per round: {args.messages}")
+    print(f"Rounds: {args.rounds}")
+    print("=" * 60)
+
+    messages = generate_messages(args.messages)
+    templates = {message_template(m) for m in messages}
+    run_once(messages[:1000])  # warm up regex and hash caches
+
+    durations = [run_once(messages) for _ in range(args.rounds)]
+    per_message_us = [d / args.messages * 1e6 for d in durations]
+    best_us = min(per_message_us)
+    throughput = 1e6 / best_us
+
+    print("Results")
+    print("=" * 60)
+    print(f"Distinct templates: {len(templates)} (from {args.messages} messages)")
+    print(f"Per message (us): best {best_us:.2f}, median {statistics.median(per_message_us):.2f}")
+    print(f"Throughput (one core): {throughput:,.0f} messages/second")
+    for label, rate in (("Sustained", SUSTAINED_RATE), ("Burst", BURST_RATE)):
+        share = rate / throughput * 100
+        print(f"{label} {rate:,}/s: {share:.2f}% of one core")
+    print("=" * 60)
+
+    return 0 if throughput >= BURST_RATE else 1
+
+if __name__ == "__main__":
+    sys.exit(run_benchmark())
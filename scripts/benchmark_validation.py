@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Ingest Validation Benchmark for Simple Log Service
+Measures the cost of parsing and normalizing ingest payloads
+(lambda/ingest/validation.py) against the previous path, which only
+parsed the JSON body and checked that the four required keys were present.
+Compares both with the ingest rates in docs/ARCHITECTURE.md (1,000 logs/s
+sustained, 5,000 requests/s burst). Runs locally; no AWS access needed.
+
+Usage:
+    python scripts/benchmark_validation.py --payloads 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'ingest'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda', 'shared', 'python'))
+
+from validation import ValidationError, Validator, parse_body
+
+# Ingest rates from docs/ARCHITECTURE.md
+SUSTAINED_RATE = 1000
+BURST_RATE = 5000
+
+LEVELS = ['DEBUG', 'INFO', 'info', 'WARNING', 'ERROR']
+
+def generate_events(count, seed=42):
+    """API Gateway events shaped like scripts/load_test.py traffic"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    events = []
+    for i in range(count):
+        body = {
+            'service_name': f'service-{rng.randint(1, 20)}',
+            'log_type': rng.choice(['application', 'system', 'audit']),
+            'level': rng.choice(LEVELS),
+            'message': f"Request {uuid.UUID(int=rng.getrandbits(128))} completed in {rng.randint(1, 5000)} ms",
+            'timestamp': (now - timedelta(seconds=rng.randint(0, 3600))).isoformat() + 'Z',
+            'metadata': {
+                'request_id': str(uuid.UUID(int=rng.getrandbits(128))),
+                'user_id': str(rng.randint(1, 10**6)),
+                'duration_ms': round(rng.random() * 500, 2),
+                'http': {'method': rng.choice(['GET', 'POST']), 'status': rng.choice([200, 201, 404, 500])}
+            }
+        }
+        events.append({'body': json.dumps(body)})
+    return events
+
+def previous_path(event):
+    """What ingest did before validation.py: parse and check required keys"""
+    body = json.loads(event['body'])
+    missing_fields = [f for f in ['service_name', 'log_type', 'level', 'message'] if f not in body]
+    if missing_fields:
+        raise ValueError(missing_fields)
+    return {
+        'timestamp': body.get('timestamp', datetime.utcnow().isoformat() + 'Z'),
+        'service_name': body['service_name'],
+        'log_type': body['log_type'],
+        'level': body['level'].upper(),
+        'message': body['message'],
+        'metadata': body.get('metadata')
+    }
+
+def run_once(process, events):
+    start = time.perf_counter()
+    for event in events:
+        process(event)
+    return time.perf_counter() - start
+
+def run_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark ingest payload validation")
+    parser.add_argument("--payloads", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Simple Log Service - Ingest Validation Benchmark")
+    print("=" * 60)
+    print(f"Payloads per round: {args.payloads}")
+    print(f"Rounds: {args.rounds}")
+    print("=" * 60)
+
+    events = generate_events(args.payloads)
+    validator = Validator()
+
+    def validated_path(event):
+        return validator.normalize(parse_body(event))
+
+    # Every generated payload is valid, so both paths do the full work
+    for event in events[:1000]:
+        try:
+            validated_path(event)
+        except ValidationError as e:
+            print(f"ERROR: generated payload rejected: {e}")
+            return 1
+        previous_path(event)
+
+    results = {}
+    for label, process in (("Previous (parse + key check)", previous_path),
+                           ("Validated (parse + normalize)", validated_path)):
+        durations = [run_once(process, events) for _ in range(args.rounds)]
+        per_payload_us = [d / args.payloads * 1e6 for d in durations]
+        results[label] = min(per_payload_us), statistics.median(per_payload_us)
+
+    print("Results")
+    print("=" * 60)
+    for label, (best_us, median_us) in results.items():
+        print(f"{label}: best {best_us:.2f} us, median {median_us:.2f} us per payload")
+    previous_us = results["Previous (parse + key check)"][0]
+    validated_us = results["Validated (parse + normalize)"][0]
+    throughput = 1e6 / validated_us
+    print(f"Validation overhead: {validated_us - previous_us:.2f} us per payload "
+          f"({validated_us / previous_us:.1f}x the previous path)")
+    print(f"Throughput (one core): {throughput:,.0f} payloads/second")
+    for label, rate in (("Sustained", SUSTAINED_RATE), ("Burst", BURST_RATE)):
+        share = rate / throughput * 100
+        print(f"{label} {rate:,}/s: {share:.2f}% of one core")
+    print("=" * 60)
+
+    return 0 if throughput >= BURST_RATE else 1
+
+if __name__ == "__main__":
+    sys.exit(run_benchmark())
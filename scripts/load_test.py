@@ -6,6 +6,7 @@ Compatible with Windows PowerShell
 """
 
 import json
+import os
 import time
 import statistics
 from datetime import datetime
@@ -16,8 +17,9 @@ from botocore.awsrequest import AWSRequest
 import requests
 
 # Configuration
-API_ENDPOINT = ""  # Set from Terraform output
+API_ENDPOINT = os.environ.get("API_ENDPOINT", "")  # Set from Terraform output
 REGION = "eu-west-2"
+SKIP_SIGV4 = os.environ.get("SKIP_SIGV4", "").lower() == "true"  # e.g. against scripts/local_api.py
 NUM_REQUESTS = 100
 CONCURRENT_WORKERS = 10
 
@@ -47,6 +49,9 @@ def get_api_endpoint():
 
 def sign_request(method, url, body=None):
     """Sign request with AWS SigV4"""
+    if SKIP_SIGV4:
+        return {}
+    
     session = boto3.Session()
     credentials = session.get_credentials()
     
@@ -81,7 +86,7 @@ def ingest_log(request_id):
         duration = (time.time() - start_time) * 1000  # Convert to ms
         
         return {
-            "success": response.status_code == 201,
+            "success": response.status_code in (201, 202),  # 202 = sampled out
             "status_code": response.status_code,
             "duration_ms": duration,
             "request_id": request_id
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Local API Gateway Emulator for Simple Log Service
+Serves the POST/GET /logs and GET /logs/{recent,lookup,analytics} routes from terraform/api_gateway.tf
+on localhost, invoking the Lambda handlers with AWS_PROXY integration events
+against an in-memory (moto) DynamoDB table or the embedded segment store.
+No AWS account is needed.
+
+Each handler module is loaded once and shared by all --workers threads, so up to
+N invocations run concurrently against one module instance. A Lambda container
+handles one invocation at a time, so per-container state (the sampling budget,
+sketches, caches) sees N times the traffic it would in AWS; use --workers 1 to
+reproduce single-container behaviour.
+
+Usage:
+    python scripts/local_api.py --port 8080 --workers 8
+    python scripts/local_api.py --store segment --data-dir ./log-data
+    API_ENDPOINT=http://127.0.0.1:8080/local SKIP_SIGV4=true python scripts/load_test.py
+"""
+
+import argparse
+import asyncio
+import base64
+import importlib.util
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qsl
+
+# Configuration
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TABLE_NAME = "simple-log-service-logs-local"
+SKETCH_TABLE_NAME = "simple-log-service-sketches-local"
+REGION = "us-east-1"
+DEFAULT_STAGE = "local"
+MAX_BODY_BYTES = 10 * 1024 * 1024  # API Gateway payload limit
+SHARED_LAYER = os.path.join(REPO_ROOT, 'lambda', 'shared', 'python')
+
+# Routes mirror the resources and methods in terraform/api_gateway.tf
+ROUTES = {
+    ("POST", "/logs"): "ingest",
+    ("GET", "/logs"): "read_recent",
+    ("GET", "/logs/recent"): "read_recent",
+    ("GET", "/logs/lookup"): "read_recent",
+    ("GET", "/logs/analytics"): "read_recent",
+}
+
+# terraform/variables.tf defaults; sketches flush sooner so analytics update while testing
+DEFAULT_INDEXED_METADATA_KEYS = "trace_id,request_id"
+DEFAULT_SKETCH_DISTINCT_KEYS = "request_id"
+DEFAULT_SKETCH_PERCENTILE_KEYS = "duration_ms"
+DEFAULT_SKETCH_FLUSH_SECONDS = "5"
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    403: "Forbidden",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+def configure_environment(store, data_dir):
+    """Point boto3 at fake credentials and the local store before handlers load"""
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_SECURITY_TOKEN', 'testing')
+    os.environ.setdefault('AWS_SESSION_TOKEN', 'testing')
+    os.environ['AWS_DEFAULT_REGION'] = REGION
+    os.environ['DYNAMODB_TABLE_NAME'] = TABLE_NAME
+    os.environ['SKETCH_TABLE_NAME'] = SKETCH_TABLE_NAME
+    os.environ['ENVIRONMENT'] = 'local'
+    os.environ['LOG_STORE_BACKEND'] = store
+    os.environ.setdefault('INDEXED_METADATA_KEYS', DEFAULT_INDEXED_METADATA_KEYS)
+    os.environ.setdefault('SKETCH_DISTINCT_KEYS', DEFAULT_SKETCH_DISTINCT_KEYS)
+    os.environ.setdefault('SKETCH_PERCENTILE_KEYS', DEFAULT_SKETCH_PERCENTILE_KEYS)
+    os.environ.setdefault('SKETCH_FLUSH_SECONDS', DEFAULT_SKETCH_FLUSH_SECONDS)
+    if data_dir:
+        os.environ['LOG_STORE_PATH'] = os.path.abspath(data_dir)
+
+def start_dynamodb_backend():
+    """Start moto and create the logs and sketch tables with the same keys and indexes as terraform/dynamodb.tf"""
+    import boto3
+    from moto import mock_aws
+
+    add_shared_layer()
+    from log_store import get_indexed_attributes, index_name
+
+    mock = mock_aws()
+    mock.start()
+
+    indexed = get_indexed_attributes()
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    table = dynamodb.create_table(
+        TableName=TABLE_NAME,
+        KeySchema=[
+            {'AttributeName': 'log_id', 'KeyType': 'HASH'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'log_id', 'AttributeType': 'S'},
+            {'AttributeName': 'timestamp', 'AttributeType': 'S'},
+            {'AttributeName': 'service_name', 'AttributeType': 'S'}
+        ] + [{'AttributeName': key, 'AttributeType': 'S'} for key in indexed],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': 'timestamp-index',
+                'KeySchema': [{'AttributeName': 'timestamp', 'KeyType': 'HASH'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            },
+            {
+                'IndexName': 'service-name-index',
+                'KeySchema': [
+                    {'AttributeName': 'service_name', 'KeyType': 'HASH'},
+                    {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }
+        ] + [
+            {
+                'IndexName': index_name(key),
+                'KeySchema': [
+                    {'AttributeName': key, 'KeyType': 'HASH'},
+                    {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }
+            for key in indexed
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    table.meta.client.get_waiter('table_exists').wait(TableName=TABLE_NAME)
+
+    sketch_table = dynamodb.create_table(
+        TableName=SKETCH_TABLE_NAME,
+        KeySchema=[
+            {'AttributeName': 'service_name', 'KeyType': 'HASH'},
+            {'AttributeName': 'bucket', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'service_name', 'AttributeType': 'S'},
+            {'AttributeName': 'bucket', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    sketch_table.meta.client.get_waiter('table_exists').wait(TableName=SKETCH_TABLE_NAME)
+    return mock
+
+def add_shared_layer():
+    """The shared layer is mounted on the Lambda path in AWS"""
+    if SHARED_LAYER not in sys.path:
+        sys.path.insert(0, SHARED_LAYER)
+
+def load_handler(function_dir):
+    """
+    Import a Lambda function's index.py once, like a warm Lambda container.
+    Module-level state (clients, caches, sampler) is shared by every invocation,
+    including invocations running at the same time on other worker threads.
+    """
+    path = os.path.join(REPO_ROOT, 'lambda', function_dir)
+    sys.path.insert(0, path)
+    add_shared_layer()
+    spec = importlib.util.spec_from_file_location(f"{function_dir}_handler", os.path.join(path, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.lambda_handler
+
+class LambdaContext:
+    """Minimal stand-in for the Lambda context object"""
+
+    def __init__(self, function_name, timeout_seconds=30):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.memory_limit_in_mb = 256
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = f"arn:aws:lambda:{REGION}:000000000000:function:{function_name}"
+        self._deadline = time.time() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.time()) * 1000))
+
+def build_proxy_event(method, resource, path, query, headers, body, stage):
+    """Build a REST API (v1) AWS_PROXY integration event"""
+    params = {}
+    multi_params = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        params[key] = value
+        multi_params.setdefault(key, []).append(value)
+
+    is_base64 = False
+    if body:
+        try:
+            body_text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            body_text = base64.b64encode(body).decode('ascii')
+            is_base64 = True
+    else:
+        body_text = None
+
+    epoch = time.time()
+    now = datetime.fromtimestamp(epoch, tz=timezone.utc)
+    return {
+        'resource': resource,
+        'path': path,
+        'httpMethod': method,
+        'headers': dict(headers) or None,
+        'multiValueHeaders': {k: [v] for k, v in headers.items()} or None,
+        'queryStringParameters': params or None,
+        'multiValueQueryStringParameters': multi_params or None,
+        'pathParameters': None,
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': resource,
+            'httpMethod': method,
+            'path': f"/{stage}{path}",
+            'stage': stage,
+            'requestId': str(uuid.uuid4()),
+            'requestTime': now.strftime('%d/%b/%Y:%H:%M:%S +0000'),
+            'requestTimeEpoch': int(epoch * 1000),
+            'identity': {
+                'sourceIp': headers.get('X-Forwarded-For', '127.0.0.1'),
+                'userAgent': headers.get('User-Agent', '')
+            }
+        },
+        'body': body_text,
+        'isBase64Encoded': is_base64
+    }
+
+def render_response(status, headers, body):
+    """Serialize an HTTP/1.1 response"""
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}"]
+    headers = dict(headers)
+    headers['Content-Length'] = str(len(body))
+    headers.setdefault('Content-Type', 'application/json')
+    for name, value in headers.items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body
+
+class LocalApiGateway:
+    """asyncio HTTP front end that dispatches routes to Lambda handlers on a worker pool"""
+
+    def __init__(self, handlers, workers, stage=DEFAULT_STAGE, verbose=False):
+        self.handlers = handlers
+        self.stage = stage
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lambda")
+
+    def resolve(self, method, path):
+        """Strip the optional stage prefix and look up the route"""
+        prefix = f"/{self.stage}"
+        if path == prefix or path.startswith(prefix + "/"):
+            path = path[len(prefix):] or "/"
+        if len(path) > 1:
+            path = path.rstrip("/")
+        return path, ROUTES.get((method, path))
+
+    def invoke(self, function_name, event):
+        """Run a handler on a worker thread and return its proxy response"""
+        context = LambdaContext(function_name)
+        return self.handlers[function_name](event, context)
+
+    async def dispatch(self, method, target, headers, body):
+        parts = urlsplit(target)
+        path, function_name = self.resolve(method, parts.path)
+        if function_name is None:
+            # API Gateway answers unknown routes with 403, not 404
+            return 403, {}, json.dumps({'message': 'Missing Authentication Token'}).encode()
+
+        event = build_proxy_event(method, path, path, parts.query, headers, body, self.stage)
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, self.invoke, function_name, event)
+        except Exception as e:
+            print(f"ERROR: {function_name} raised: {e}")
+            return 502, {}, json.dumps({'message': 'Internal server error'}).encode()
+
+        if not isinstance(result, dict) or 'statusCode' not in result:
+            print(f"ERROR: {function_name} returned a malformed proxy response")
+            return 502, {}, json.dumps({'message': 'Internal server error'}).encode()
+
+        response_body = result.get('body') or ''
+        if result.get('isBase64Encoded'):
+            response_bytes = base64.b64decode(response_body)
+        else:
+            response_bytes = response_body.encode('utf-8')
+        return int(result['statusCode']), result.get('headers') or {}, response_bytes
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection, honouring HTTP/1.1 keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    writer.write(render_response(400, {'Connection': 'close'}, b''))
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().title()] = value.strip()
+
+                try:
+                    length = int(headers.get('Content-Length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    writer.write(render_response(400, {'Connection': 'close'}, b''))
+                    break
+                if length > MAX_BODY_BYTES:
+                    writer.write(render_response(413, {'Connection': 'close'}, b''))
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                start = time.perf_counter()
+                status, response_headers, response_body = await self.dispatch(method, target, headers, body)
+                if self.verbose:
+                    duration = (time.perf_counter() - start) * 1000
+                    print(f"{method} {target} -> {status} ({duration:.1f} ms)")
+
+                keep_alive = (
+                    version == 'HTTP/1.1' and headers.get('Connection', '').lower() != 'close'
+                ) or headers.get('Connection', '').lower() == 'keep-alive'
+                response_headers = dict(response_headers)
+                response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                writer.write(render_response(status, response_headers, response_body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(gateway, host, port, backend_description):
+    server = await asyncio.start_server(gateway.handle_connection, host, port)
+    print("=" * 60)
+    print("Simple Log Service - Local API Gateway")
+    print("=" * 60)
+    print(f"Endpoint: http://{host}:{port}/{gateway.stage}")
+    for (method, path), function_name in ROUTES.items():
+        print(f"  {method:4} {path:14} -> lambda/{function_name}")
+    print(f"Log store: {backend_description}")
+    print("=" * 60)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Simple Log Service API locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="Concurrent Lambda invocations, all sharing one handler instance")
+    parser.add_argument("--stage", default=DEFAULT_STAGE, help="Optional stage prefix in request paths")
+    parser.add_argument("--verbose", action="store_true", help="Print one line per request")
+    parser.add_argument("--store", choices=["dynamodb", "segment"], default="dynamodb",
+                        help="dynamodb (in-memory moto table) or segment (embedded files)")
+    parser.add_argument("--data-dir", default=None, help="Segment store directory (--store segment)")
+    args = parser.parse_args()
+
+    if args.store == "segment" and not args.data_dir:
+        parser.error("--data-dir is required with --store segment")
+
+    configure_environment(args.store, args.data_dir)
+    if args.store == "dynamodb":
+        mock = start_dynamodb_backend()
+        backend_description = f"DynamoDB table {TABLE_NAME} (in-memory)"
+    else:
+        mock = None
+        backend_description = f"segment store at {os.path.abspath(args.data_dir)}"
+
+    handlers = {name: load_handler(name) for name in set(ROUTES.values())}
+    gateway = LocalApiGateway(handlers, args.workers, stage=args.stage, verbose=args.verbose)
+
+    try:
+        asyncio.run(serve(gateway, args.host, args.port, backend_description))
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        gateway.executor.shutdown(wait=True)
+        import log_store
+        log_store.reset_stores()
+        if mock is not None:
+            mock.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,6 +28,20 @@ resource "aws_api_gateway_resource" "logs_recent" {
   path_part   = "recent"
 }
 
+# /logs/lookup resource
+resource "aws_api_gateway_resource" "logs_lookup" {
+  rest_api_id = aws_api_gateway_rest_api.log_api.id
+  parent_id   = aws_api_gateway_resource.logs.id
+  path_part   = "lookup"
+}
+
+# /logs/analytics resource
+resource "aws_api_gateway_resource" "logs_analytics" {
+  rest_api_id = aws_api_gateway_rest_api.log_api.id
+  parent_id   = aws_api_gateway_resource.logs.id
+  path_part   = "analytics"
+}
+
 # POST /logs method with IAM authorization
 resource "aws_api_gateway_method" "post_logs" {
   rest_api_id   = aws_api_gateway_rest_api.log_api.id
@@ -45,6 +59,23 @@ resource "aws_api_gateway_integration" "post_logs" {
   uri                     = aws_lambda_function.ingest_log.invoke_arn
 }
 
+# GET /logs?ids=... method with IAM authorization (batch lookup by log_id)
+resource "aws_api_gateway_method" "get_logs" {
+  rest_api_id   = aws_api_gateway_rest_api.log_api.id
+  resource_id   = aws_api_gateway_resource.logs.id
+  http_method   = "GET"
+  authorization = "AWS_IAM"
+}
+
+resource "aws_api_gateway_integration" "get_logs" {
+  rest_api_id             = aws_api_gateway_rest_api.log_api.id
+  resource_id             = aws_api_gateway_resource.logs.id
+  http_method             = aws_api_gateway_method.get_logs.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.read_recent.invoke_arn
+}
+
 # GET /logs/recent method with IAM authorization
 resource "aws_api_gateway_method" "get_logs_recent" {
   rest_api_id   = aws_api_gateway_rest_api.log_api.id
@@ -62,13 +93,50 @@ resource "aws_api_gateway_integration" "get_logs_recent" {
   uri                     = aws_lambda_function.read_recent.invoke_arn
 }
 
+# GET /logs/lookup method with IAM authorization
+resource "aws_api_gateway_method" "get_logs_lookup" {
+  rest_api_id   = aws_api_gateway_rest_api.log_api.id
+  resource_id   = aws_api_gateway_resource.logs_lookup.id
+  http_method   = "GET"
+  authorization = "AWS_IAM"
+}
+
+resource "aws_api_gateway_integration" "get_logs_lookup" {
+  rest_api_id             = aws_api_gateway_rest_api.log_api.id
+  resource_id             = aws_api_gateway_resource.logs_lookup.id
+  http_method             = aws_api_gateway_method.get_logs_lookup.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.read_recent.invoke_arn
+}
+
+# GET /logs/analytics method with IAM authorization
+resource "aws_api_gateway_method" "get_logs_analytics" {
+  rest_api_id   = aws_api_gateway_rest_api.log_api.id
+  resource_id   = aws_api_gateway_resource.logs_analytics.id
+  http_method   = "GET"
+  authorization = "AWS_IAM"
+}
+
+resource "aws_api_gateway_integration" "get_logs_analytics" {
+  rest_api_id             = aws_api_gateway_rest_api.log_api.id
+  resource_id             = aws_api_gateway_resource.logs_analytics.id
+  http_method             = aws_api_gateway_method.get_logs_analytics.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.read_recent.invoke_arn
+}
+
 # API Gateway deployment
 resource "aws_api_gateway_deployment" "log_api" {
   rest_api_id = aws_api_gateway_rest_api.log_api.id
 
   depends_on = [
     aws_api_gateway_integration.post_logs,
-    aws_api_gateway_integration.get_logs_recent
+    aws_api_gateway_integration.get_logs,
+    aws_api_gateway_integration.get_logs_recent,
+    aws_api_gateway_integration.get_logs_lookup,
+    aws_api_gateway_integration.get_logs_analytics
   ]
 
   lifecycle {
@@ -19,6 +19,15 @@ resource "aws_dynamodb_table" "logs" {
     type = "S"
   }
 
+  # Promoted metadata keys (e.g. trace_id) - only items that carry them are indexed
+  dynamic "attribute" {
+    for_each = var.indexed_metadata_keys
+    content {
+      name = attribute.value
+      type = "S"
+    }
+  }
+
   # Global Secondary Index for querying by timestamp
   global_secondary_index {
     name            = "timestamp-index"
@@ -34,6 +43,17 @@ resource "aws_dynamodb_table" "logs" {
     projection_type = "ALL"
   }
 
+  # Sparse Global Secondary Indexes for point lookups by promoted metadata key
+  dynamic "global_secondary_index" {
+    for_each = var.indexed_metadata_keys
+    content {
+      name            = "${replace(global_secondary_index.value, "_", "-")}-index"
+      hash_key        = global_secondary_index.value
+      range_key       = "timestamp"
+      projection_type = "ALL"
+    }
+  }
+
   # Enable point-in-time recovery
   point_in_time_recovery {
     enabled = true
@@ -61,3 +81,37 @@ resource "aws_dynamodb_table" "logs" {
   }
 }
 
+# DynamoDB table for analytics sketches (one item per service and hour bucket)
+resource "aws_dynamodb_table" "sketches" {
+  name         = "${var.project_name}-sketches-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "service_name"
+  range_key    = "bucket"
+
+  attribute {
+    name = "service_name"
+    type = "S"
+  }
+
+  attribute {
+    name = "bucket"
+    type = "S"
+  }
+
+  # Enable point-in-time recovery
+  point_in_time_recovery {
+    enabled = true
+  }
+
+  # Enable server-side encryption with customer-managed KMS key
+  server_side_encryption {
+    enabled     = true
+    kms_key_arn = aws_kms_key.dynamodb.arn
+  }
+
+  tags = {
+    Name        = "${var.project_name}-sketches-${var.environment}"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
@@ -74,7 +74,7 @@ resource "aws_iam_role_policy" "log_ingest_policy" {
         Action = [
           "execute-api:Invoke"
         ]
-        Resource = "arn:aws:execute-api:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:${aws_api_gateway_rest_api.log_api.id}/${var.environment}/*/logs"
+        Resource = "arn:aws:execute-api:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:${aws_api_gateway_rest_api.log_api.id}/${var.environment}/POST/logs"
       },
       {
         Effect = "Allow"
@@ -170,7 +170,10 @@ resource "aws_iam_role_policy" "log_read_policy" {
         Action = [
           "execute-api:Invoke"
         ]
-        Resource = "arn:aws:execute-api:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:${aws_api_gateway_rest_api.log_api.id}/${var.environment}/*/logs/*"
+        Resource = [
+          "arn:aws:execute-api:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:${aws_api_gateway_rest_api.log_api.id}/${var.environment}/GET/logs",
+          "arn:aws:execute-api:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:${aws_api_gateway_rest_api.log_api.id}/${var.environment}/*/logs/*"
+        ]
       },
       {
         Effect = "Allow"
@@ -333,10 +336,20 @@ resource "aws_iam_role_policy" "ingest_lambda_policy" {
       {
         Effect = "Allow"
         Action = [
-          "dynamodb:PutItem"
+          "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:UpdateItem"
         ]
         Resource = aws_dynamodb_table.logs.arn
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem"
+        ]
+        Resource = aws_dynamodb_table.sketches.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -406,6 +419,7 @@ resource "aws_iam_role_policy" "read_lambda_policy" {
         Action = [
           "dynamodb:Query",
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:Scan"
         ]
         Resource = [
@@ -413,6 +427,13 @@ resource "aws_iam_role_policy" "read_lambda_policy" {
           "${aws_dynamodb_table.logs.arn}/index/*"
         ]
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:Query"
+        ]
+        Resource = aws_dynamodb_table.sketches.arn
+      },
       {
         Effect = "Allow"
         Action = [
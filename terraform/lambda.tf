@@ -1,5 +1,21 @@
 # Defines the ingest and read_recent Lambda functions with their configurations
 
+# Package the shared layer (log_store package under python/)
+data "archive_file" "shared_layer_zip" {
+  type        = "zip"
+  source_dir  = "${path.module}/../lambda/shared"
+  output_path = "${path.module}/lambda_packages/shared_layer.zip"
+  excludes    = ["tests"]
+}
+
+# Shared Lambda layer used by both functions
+resource "aws_lambda_layer_version" "shared" {
+  filename            = data.archive_file.shared_layer_zip.output_path
+  layer_name          = "simple-log-service-shared-${var.environment}"
+  source_code_hash    = data.archive_file.shared_layer_zip.output_base64sha256
+  compatible_runtimes = ["python3.11"]
+}
+
 # Package the ingest Lambda function code
 data "archive_file" "ingest_lambda_zip" {
   type        = "zip"
@@ -17,11 +33,22 @@ resource "aws_lambda_function" "ingest_log" {
   runtime          = "python3.11"
   timeout          = 30
   memory_size      = 256
+  layers           = [aws_lambda_layer_version.shared.arn]
 
   environment {
     variables = {
-      DYNAMODB_TABLE_NAME = aws_dynamodb_table.logs.name
-      ENVIRONMENT         = var.environment
+      DYNAMODB_TABLE_NAME     = aws_dynamodb_table.logs.name
+      SKETCH_TABLE_NAME       = aws_dynamodb_table.sketches.name
+      ENVIRONMENT             = var.environment
+      SAMPLING_RULES          = var.sampling_rules
+      SAMPLING_FLUSH_SECONDS  = var.sampling_flush_seconds
+      SAMPLING_CONTAINERS     = var.sampling_containers
+      COALESCE_WINDOW_SECONDS = var.coalesce_window_seconds
+      INDEXED_METADATA_KEYS   = join(",", var.indexed_metadata_keys)
+      SKETCH_DISTINCT_KEYS    = join(",", var.sketch_distinct_keys)
+      SKETCH_PERCENTILE_KEYS  = join(",", var.sketch_percentile_keys)
+      SKETCH_FLUSH_SECONDS    = var.sketch_flush_seconds
+      VALIDATION_LIMITS       = var.validation_limits
     }
   }
 
@@ -54,11 +81,14 @@ resource "aws_lambda_function" "read_recent" {
   runtime          = "python3.11"
   timeout          = 30
   memory_size      = 256
+  layers           = [aws_lambda_layer_version.shared.arn]
 
   environment {
     variables = {
-      DYNAMODB_TABLE_NAME = aws_dynamodb_table.logs.name
-      ENVIRONMENT         = var.environment
+      DYNAMODB_TABLE_NAME   = aws_dynamodb_table.logs.name
+      SKETCH_TABLE_NAME     = aws_dynamodb_table.sketches.name
+      ENVIRONMENT           = var.environment
+      INDEXED_METADATA_KEYS = join(",", var.indexed_metadata_keys)
     }
   }
 
@@ -11,6 +11,11 @@ output "dynamodb_table_arn" {
   value       = aws_dynamodb_table.logs.arn
 }
 
+output "sketch_table_name" {
+  description = "DynamoDB table name for analytics sketches"
+  value       = aws_dynamodb_table.sketches.name
+}
+
 # Lambda function outputs
 output "ingest_lambda_function_name" {
   description = "Ingest Lambda function name"
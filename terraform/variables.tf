@@ -84,3 +84,57 @@ variable "external_id_full_access" {
   default     = ""
   sensitive   = true
 }
+
+variable "sampling_rules" {
+  description = "JSON sampling rules for low-severity logs per service (empty disables sampling, see lambda/ingest/sampling.py)"
+  type        = string
+  default     = ""
+}
+
+variable "sampling_containers" {
+  description = "Expected concurrent ingest Lambda containers; each holds target_wps / sampling_containers of a service's sampling budget"
+  type        = number
+  default     = 1
+}
+
+variable "sampling_flush_seconds" {
+  description = "How often the ingest Lambda writes dropped-count summary items"
+  type        = number
+  default     = 60
+}
+
+variable "coalesce_window_seconds" {
+  description = "Window in which repeated messages (same service, level and message template) update one item, keeping only the first occurrence's message and metadata; 0 disables coalescing"
+  type        = number
+  default     = 0
+}
+
+variable "indexed_metadata_keys" {
+  description = "Metadata keys promoted to top-level attributes with a sparse GSI each (for GET /logs/lookup)"
+  type        = list(string)
+  default     = ["trace_id", "request_id"]
+}
+
+variable "sketch_distinct_keys" {
+  description = "Metadata keys with a HyperLogLog distinct-count sketch per service and hour (for GET /logs/analytics)"
+  type        = list(string)
+  default     = ["request_id"]
+}
+
+variable "sketch_percentile_keys" {
+  description = "Numeric metadata keys with a t-digest percentile sketch per service and hour (for GET /logs/analytics)"
+  type        = list(string)
+  default     = ["duration_ms"]
+}
+
+variable "sketch_flush_seconds" {
+  description = "How often the ingest Lambda merges buffered sketches into the sketch table"
+  type        = number
+  default     = 60
+}
+
+variable "validation_limits" {
+  description = "JSON per-service ingest payload limits (empty uses the defaults, see lambda/ingest/validation.py)"
+  type        = string
+  default     = ""
+}